@@ -1,24 +1,91 @@
+import io
+import threading
+from collections import OrderedDict
+
 from PIL import Image
 import numpy as np
 import streamlit as st
 
+from instrumentation import stage, track_request
+
+
+FLAG_PATH = "assets/china.png"
+FLAG_OFFSET_X = 66
+LAYER_CACHE_SIZE = 8
+
 
 @st.cache_resource
 def _load_flag():
-    return Image.open("assets/china.png").convert("RGBA")
+    return Image.open(FLAG_PATH).convert("RGBA")
+
+
+# 按 (国旗, 目标尺寸) 缓存的图层：先把国旗区域缩放到目标尺寸，再在目标分辨率上算距离场，
+# 拖动强度滑块时只需查一次表并混合
+_layer_cache = OrderedDict()
+_layer_lock = threading.Lock()
+# 距离量化到 1/DISTANCE_STEPS 像素后存成 uint16 下标，强度对应的 alpha 由查找表给出
+DISTANCE_STEPS = 16
+
 
+def _flag_layers(flag: Image.Image, target_size):
+    # 返回 (国旗 RGB 各通道, 国旗自身 alpha, 量化距离下标)
+    key = (id(flag), tuple(target_size))
+    with _layer_lock:
+        if key in _layer_cache:
+            _layer_cache.move_to_end(key)
+            return _layer_cache[key][1]
 
-def _build_overlay(flag: Image.Image, strength: float, target_size):
+    tw, th = target_size
     _, h = flag.size
-    region = flag.crop((66, 0, h + 66, h)).convert("RGBA")
-    region_arr = np.array(region, dtype=np.uint8)
+    region = flag.crop((FLAG_OFFSET_X, 0, h + FLAG_OFFSET_X, h)).convert("RGBA").resize((tw, th))
+    red, green, blue, flag_alpha = region.split()
+
+    # 目标像素中心映射回原始国旗坐标，距离与先算后缩放的结果一致
+    xs = (np.arange(tw, dtype=np.float32) + 0.5) * (h / tw) - 0.5
+    ys = (np.arange(th, dtype=np.float32) + 0.5) * (h / th) - 0.5
+    np.maximum(xs, 0, out=xs)
+    np.maximum(ys, 0, out=ys)
+    distance = np.sqrt(xs[None, :] * xs[None, :] + ys[:, None] * ys[:, None])
+    distance *= np.float32(DISTANCE_STEPS)
+    # 超出 uint16 的距离在任何强度下 alpha 都已为 0，截断不影响结果
+    np.minimum(distance, np.iinfo(np.uint16).max, out=distance)
+    dist_idx = distance.astype(np.uint16)
+
+    layers = ((red, green, blue), np.asarray(flag_alpha), dist_idx)
+    with _layer_lock:
+        # 同时持有 flag 引用，避免 id 被复用
+        _layer_cache[key] = (flag, layers)
+        while len(_layer_cache) > LAYER_CACHE_SIZE:
+            _layer_cache.popitem(last=False)
+    return layers
+
+
+def _overlay_alpha(flag: Image.Image, strength: float, target_size):
+    # 返回 uint8 alpha：clip(255 - floor(距离 / 强度)) 与国旗自身 alpha 取小，
+    # 距离场只参与一次查表，不再逐像素做浮点运算
+    _, flag_alpha, dist_idx = _flag_layers(flag, target_size)
+    steps = np.arange(int(dist_idx.max()) + 1, dtype=np.float32) / np.float32(DISTANCE_STEPS * strength)
+    lut = np.clip(255 - np.floor(steps), 0, 255).astype(np.uint8)
+    alpha = lut[dist_idx]
+    np.minimum(alpha, flag_alpha, out=alpha)
+    return alpha
+
+
+def composite_overlay(head: Image.Image, flag: Image.Image, strength: float):
+    # 等价于 head.paste(overlay, (0, 0), overlay)：叠加层以自身 alpha 为蒙版，所有通道（含 alpha）
+    # 按 out = ov * a + head * (1 - a) 混合；混合由 Pillow 在 uint8 上完成
+    if head.mode != "RGBA":
+        head = head.convert("RGBA")
+    bands, _, _ = _flag_layers(flag, head.size)
+    mask = Image.fromarray(_overlay_alpha(flag, strength, head.size))
+    overlay = Image.merge("RGBA", (*bands, mask))
+    return Image.composite(overlay, head, mask)
 
-    y_idx, x_idx = np.indices((h, h))
-    distance = np.sqrt(x_idx * x_idx + y_idx * y_idx)
-    alpha_mask = np.clip(255 - np.floor(distance / strength), 0, 255).astype(np.uint8)
-    region_arr[..., 3] = np.minimum(region_arr[..., 3], alpha_mask)
 
-    return Image.fromarray(region_arr, mode="RGBA").resize(target_size)
+@st.cache_resource(max_entries=4)
+def _decode_head(data: bytes):
+    # 同一张头像只解码一次，拖动滑块时复用
+    return Image.open(io.BytesIO(data)).convert("RGBA")
 
 
 def made_in_china():
@@ -30,10 +97,13 @@ def made_in_china():
 
     if head:
         strength = st.slider("🇨🇳 国旗渐变强度", 4.0, 8.0, 4.5, 0.1)
-        head = Image.open(head).convert("RGBA")
-        overlay = _build_overlay(flag=flag, strength=strength, target_size=head.size)
-        head.paste(overlay, (0, 0), overlay)
-        st.image(head, caption="🇨🇳 添加成功的头像", use_container_width=True)
+        with track_request("cn_png", strength=strength):
+            with stage("decode"):
+                head = _decode_head(head.getvalue())
+            with stage("overlay"):
+                result = composite_overlay(head, flag, strength)
+            with stage("transfer"):
+                st.image(result, caption="🇨🇳 添加成功的头像", use_container_width=True)
 
 
 # backward compatibility
@@ -1,25 +1,89 @@
-import streamlit as st
+import importlib
+import os
+import sys
+import threading
+import time
 
-from CN_PNG import made_in_china
-from arxiv_today import run_arxiv_today_app
-from article_to_xhs import run_article_to_xhs_app
-from pdf2png import run_pdf_to_png_app
+import streamlit as st
 
+from instrumentation import record_import, render_debug_panel, stage, track_request
 
-st.set_page_config(page_title='AI 工具箱', layout='centered', page_icon='🧰')
 
-# 侧边栏
-st.sidebar.title("🧰 工具导航")
-st.sidebar.markdown("选择你想使用的工具：")
-pages = {
-    "📄 PDF 转图片": run_pdf_to_png_app,
-    "🇨🇳 微信头像加国旗背景": made_in_china,
-    "📝 链接转小红书图片": run_article_to_xhs_app,
-    "📚 今日 arXiv 论文": run_arxiv_today_app,
+# 页面注册表：页面名 -> (模块, 入口函数)。模块只在页面第一次被选中时导入，
+# 之后常驻 sys.modules；未选中的工具不再拖慢冷启动（fitz、numpy、bs4、arxiv 等）
+PAGES = {
+    "📄 PDF 转图片": ("pdf2png", "run_pdf_to_png_app"),
+    "🇨🇳 微信头像加国旗背景": ("CN_PNG", "made_in_china"),
+    "📝 链接转小红书图片": ("article_to_xhs", "run_article_to_xhs_app"),
+    "📚 今日 arXiv 论文": ("arxiv_today", "run_arxiv_today_app"),
 }
-page = st.sidebar.radio("功能页面", list(pages.keys()))
-st.sidebar.markdown("---")
-st.sidebar.caption("Made with ❤️ by WangGuo")
+# 首屏渲染完成后在后台线程预先导入其余工具模块；WEBAPP_PREWARM=0 关闭
+PREWARM = os.environ.get("WEBAPP_PREWARM", "1") != "0"
+
+
+def _import_tool(module_name, background=False):
+    # 总是经过 import_module：已导入的模块直接返回；后台预热正在导入时，它会等导入完成，
+    # 不会拿到初始化了一半的模块。sys.modules 只用来判断是否由这次调用首次导入、需要记录耗时
+    first_import = module_name not in sys.modules
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if first_import:
+        record_import(module_name, time.perf_counter() - started, background=background)
+    return module
+
+
+def load_page(page_name):
+    module_name, func_name = PAGES[page_name]
+    return getattr(_import_tool(module_name), func_name)
+
+
+def _prewarm(module_names):
+    for module_name in module_names:
+        try:
+            _import_tool(module_name, background=True)
+        except Exception:
+            # 预热失败不影响使用，选中该页面时会重新导入并显示错误
+            pass
+
+
+@st.cache_resource
+def _start_prewarm():
+    # 每个进程只启动一次
+    modules = [module_name for module_name, _ in PAGES.values()]
+    thread = threading.Thread(target=_prewarm, args=(modules,), name="page-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    st.set_page_config(page_title='AI 工具箱', layout='centered', page_icon='🧰')
+
+    # 侧边栏
+    st.sidebar.title("🧰 工具导航")
+    st.sidebar.markdown("选择你想使用的工具：")
+    page = st.sidebar.radio("功能页面", list(PAGES.keys()))
+    st.sidebar.markdown("---")
+    st.sidebar.caption("Made with ❤️ by WangGuo")
+
+    # 页面跳转；每个会话的首屏单独记录导入和渲染耗时
+    if not st.session_state.get("_first_paint_recorded"):
+        st.session_state["_first_paint_recorded"] = True
+        with track_request("first_paint", page=PAGES[page][0]):
+            with stage("import"):
+                run_page = load_page(page)
+            with stage("render"):
+                run_page()
+    else:
+        load_page(page)()
+
+    if PREWARM:
+        _start_prewarm()
+
+    # 性能调试面板（WEBAPP_DEBUG=1 或 ?debug=1 时显示）
+    render_debug_panel()
+
 
-# 页面跳转
-pages[page]()
+# Streamlit 以 __main__ 运行本脚本；进程池用 spawn 启动的子进程会以 __mp_main__ 重新导入它，
+# 页面渲染、后台预热和指标记录都不能在子进程里发生
+if __name__ == "__main__":
+    main()
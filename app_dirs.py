@@ -0,0 +1,13 @@
+import os
+
+
+# 所有工具共用的本地数据目录，可通过环境变量 WEBAPP_CACHE_DIR 覆盖
+CACHE_ROOT = os.environ.get("WEBAPP_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "webapp"
+)
+
+
+def cache_dir(*parts):
+    path = os.path.join(CACHE_ROOT, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,42 @@
+import os
+import zipfile
+
+
+# 这些格式本身已压缩，再 deflate 只会浪费 CPU
+STORED_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".zip", ".gz", ".pdf"}
+
+
+def compress_type_for(name):
+    suffix = os.path.splitext(name)[1].lower()
+    return zipfile.ZIP_STORED if suffix in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+
+
+def _as_entry(item, folder=""):
+    # 支持 ImageArtifact 或 (文件名, 字节) 二元组
+    if isinstance(item, tuple):
+        name, data = item
+    else:
+        name, data = item.name, item.data
+    return (f"{folder.strip('/')}/{name}" if folder else name), data
+
+
+# 边产出边写入的 ZIP 构建器，不在内存中保留整个压缩包
+class ArchiveBuilder:
+    def __init__(self, fileobj):
+        self._zip = zipfile.ZipFile(fileobj, "w")
+        self.count = 0
+
+    def add(self, item, folder=""):
+        name, data = _as_entry(item, folder)
+        self._zip.writestr(name, data, compress_type=compress_type_for(name))
+        self.count += 1
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
@@ -0,0 +1,155 @@
+import re
+import time
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:  # lxml 可选，缺失时退回 BeautifulSoup 选择器方案
+    lxml = None
+
+
+MIN_PARAGRAPH_LEN = 20
+MAX_PARAGRAPHS = 300
+NOISE_TAGS = {"script", "style", "noscript", "nav", "footer", "aside", "form", "header"}
+
+
+def _clean_text(text):
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _finalize(title, texts, description):
+    paragraphs = [t for t in texts if len(t) >= MIN_PARAGRAPH_LEN]
+
+    # 去重并保持顺序
+    seen = set()
+    unique_paragraphs = []
+    for p in paragraphs[:MAX_PARAGRAPHS]:
+        if p not in seen:
+            seen.add(p)
+            unique_paragraphs.append(p)
+
+    if not unique_paragraphs and description:
+        unique_paragraphs = [description.strip()]
+    return title or "未命名文章", unique_paragraphs
+
+
+# ====== 选择器级联（BeautifulSoup + html.parser） ======
+def extract_with_selectors(html: str):
+    soup = BeautifulSoup(html, "html.parser")
+
+    title = ""
+    og_title = soup.find("meta", property="og:title")
+    if og_title and og_title.get("content"):
+        title = og_title["content"].strip()
+    if not title and soup.title:
+        title = soup.title.get_text(strip=True)
+
+    selectors = ["article p", "main p", ".post p", ".entry-content p", ".article p"]
+    paragraph_nodes = []
+    for selector in selectors:
+        paragraph_nodes = soup.select(selector)
+        if len(paragraph_nodes) >= 3:
+            break
+    if len(paragraph_nodes) < 3:
+        paragraph_nodes = soup.find_all("p")
+
+    texts = [_clean_text(node.get_text(" ", strip=True)) for node in paragraph_nodes]
+    desc = soup.find("meta", attrs={"name": "description"})
+    return _finalize(title, texts, desc.get("content") if desc else None)
+
+
+# ====== 文本密度（lxml，单次遍历） ======
+def extract_with_density(html: str):
+    if lxml is None:
+        raise RuntimeError("未安装 lxml，无法使用文本密度提取")
+    try:
+        root = lxml.html.fromstring(html)
+    except (ValueError, lxml.etree.ParserError):
+        # 空文档或带 XML 编码声明的字符串 lxml 无法解析，交给选择器方案处理
+        return extract_with_selectors(html)
+
+    title = ""
+    description = None
+    paragraphs = []
+    scores = {}
+    # 一次遍历同时收集标题、描述和段落，并把段落得分累加到父级/祖父级容器上
+    for node in root.iter():
+        tag = node.tag
+        if not isinstance(tag, str):
+            continue
+        if tag == "meta":
+            if node.get("property") == "og:title" and node.get("content"):
+                title = node.get("content").strip()
+            elif node.get("name") == "description":
+                description = node.get("content")
+        elif tag == "title" and not title:
+            title = _clean_text(node.text_content())
+        elif tag == "p":
+            if any(ancestor.tag in NOISE_TAGS for ancestor in node.iterancestors()):
+                continue
+            text = _clean_text(node.text_content())
+            if not text:
+                continue
+            paragraphs.append((node, text))
+            if len(text) < MIN_PARAGRAPH_LEN:
+                continue
+            link_len = sum(len(a.text_content()) for a in node.iter("a"))
+            score = len(text) * (1 - min(link_len / len(text), 1))
+            parent = node.getparent()
+            if parent is not None:
+                scores[parent] = scores.get(parent, 0) + score
+                grandparent = parent.getparent()
+                if grandparent is not None:
+                    scores[grandparent] = scores.get(grandparent, 0) + score / 2
+
+    texts = [text for _, text in paragraphs]
+    if scores:
+        best = max(scores, key=scores.get)
+        selected = [
+            text for node, text in paragraphs
+            if any(ancestor is best for ancestor in node.iterancestors())
+        ]
+        if sum(len(t) >= MIN_PARAGRAPH_LEN for t in selected) >= 3:
+            texts = selected
+    return _finalize(title, texts, description)
+
+
+EXTRACTORS = {
+    "density": extract_with_density,
+    "selectors": extract_with_selectors,
+}
+
+
+def default_backend():
+    return "density" if lxml is not None else "selectors"
+
+
+def extract_article(html: str, backend: str = "auto"):
+    if backend == "auto":
+        backend = default_backend()
+    if backend not in EXTRACTORS:
+        raise ValueError(f"未知的正文提取引擎：{backend}")
+    return EXTRACTORS[backend](html)
+
+
+def compare_extractors(html: str, repeat: int = 5):
+    # 对同一份 HTML 分别计时各个提取引擎，返回 {引擎: {seconds, paragraphs, chars}}
+    report = {}
+    for name, extractor in EXTRACTORS.items():
+        if name == "density" and lxml is None:
+            continue
+        best = None
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            title, paragraphs = extractor(html)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        report[name] = {
+            "seconds": best,
+            "title": title,
+            "paragraphs": len(paragraphs),
+            "chars": sum(len(p) for p in paragraphs),
+        }
+    return report
@@ -1,16 +1,25 @@
+import csv
+import io
 import os
 import re
-import tempfile
-import textwrap
-import zipfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
 from typing import Iterable
-from io import BytesIO
 from urllib.parse import urlparse
 
-import requests
 import streamlit as st
-from bs4 import BeautifulSoup
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
+
+from archive import ArchiveBuilder
+from article_extract import EXTRACTORS, extract_article
+from artifacts import encode_image
+from fonts import load_font
+from http_client import DEFAULT_TTL as HTTP_CACHE_TTL, fetch as http_fetch
+from instrumentation import stage, track_request
+from jobs import get_job_manager, job_id_for, submit_job, wait_for_job
+from text_layout import paginate_lines, text_width, wrap_text
+from scratch import create_scratch_dir
 
 
 CANVAS_WIDTH = 1080
@@ -18,122 +27,125 @@ CANVAS_HEIGHT = 1440
 PADDING_X = 96
 PADDING_TOP = 180
 PADDING_BOTTOM = 120
-
-
-def _load_font(size: int, bold: bool = False):
-    regular_candidates = [
-        "/System/Library/Fonts/PingFang.ttc",
-        "/System/Library/Fonts/Hiragino Sans GB.ttc",
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-    ]
-    bold_candidates = [
-        "/System/Library/Fonts/PingFang.ttc",
-        "/System/Library/Fonts/Hiragino Sans GB.ttc",
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-    ]
-    candidates = bold_candidates if bold else regular_candidates
-    for path in candidates:
-        if os.path.exists(path):
-            try:
-                return ImageFont.truetype(path, size=size)
-            except Exception:
-                continue
-    return ImageFont.load_default()
-
-
-def _wrap_text(line: str, width: int):
-    if not line:
-        return [""]
-    return textwrap.wrap(line, width=width, break_long_words=True, replace_whitespace=False)
+BODY_WIDTH = CANVAS_WIDTH - PADDING_X * 2
+BODY_LINE_HEIGHT = 56
+PAGE_TITLE_LINE_HEIGHT = 56
+PAGE_TITLE_MAX_LINES = 2
+COVER_TITLE_X = 110
+COVER_TITLE_WIDTH = CANVAS_WIDTH - 70 - 40 - COVER_TITLE_X
+COVER_TITLE_MAX_LINES = 8
+OUTPUT_FORMATS = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp"}
+DEFAULT_RENDER_WORKERS = max(1, min(8, os.cpu_count() or 1))
+
+
+def _wrap_title(title: str, font, max_width: float, max_lines: int):
+    lines = wrap_text(title, font, max_width)
+    if len(lines) <= max_lines:
+        return lines
+    # 标题过长时截断并加省略号，避免静默丢字
+    last = lines[max_lines - 1]
+    while last and text_width(font, last + "…") > max_width:
+        last = last[:-1]
+    return lines[:max_lines - 1] + [last + "…"]
+
+
+def _content_layout(title: str):
+    # 正文区域的起始位置和每页可容纳的行数，分页和绘制共用同一套计算
+    title_lines = _wrap_title(title, load_font(42, bold=True), BODY_WIDTH, PAGE_TITLE_MAX_LINES)
+    body_top = PADDING_TOP + len(title_lines) * PAGE_TITLE_LINE_HEIGHT + 24
+    lines_per_page = (CANVAS_HEIGHT - PADDING_BOTTOM - body_top) // BODY_LINE_HEIGHT
+    return title_lines, body_top, lines_per_page
 
 
 def _safe_filename(name: str):
     return re.sub(r'[\\/:*?"<>|]+', "_", name).strip("_") or "article"
 
 
-def fetch_article(url: str, timeout: int = 20):
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
-        )
-    }
-    resp = requests.get(url, headers=headers, timeout=timeout)
-    resp.raise_for_status()
-    resp.encoding = resp.apparent_encoding or resp.encoding
-    soup = BeautifulSoup(resp.text, "html.parser")
-
-    title = ""
-    og_title = soup.find("meta", property="og:title")
-    if og_title and og_title.get("content"):
-        title = og_title["content"].strip()
-    if not title and soup.title:
-        title = soup.title.get_text(strip=True)
-    if not title:
-        title = "未命名文章"
-
-    selectors = ["article p", "main p", ".post p", ".entry-content p", ".article p"]
-    paragraph_nodes = []
-    for selector in selectors:
-        paragraph_nodes = soup.select(selector)
-        if len(paragraph_nodes) >= 3:
-            break
-    if len(paragraph_nodes) < 3:
-        paragraph_nodes = soup.find_all("p")
-
-    paragraphs = []
-    for node in paragraph_nodes:
-        text = re.sub(r"\s+", " ", node.get_text(" ", strip=True)).strip()
-        if len(text) >= 20:
-            paragraphs.append(text)
-
-    # 去重并保持顺序
-    seen = set()
-    unique_paragraphs = []
-    for p in paragraphs[:300]:
-        if p not in seen:
-            seen.add(p)
-            unique_paragraphs.append(p)
-
-    if not unique_paragraphs:
-        desc = soup.find("meta", attrs={"name": "description"})
-        if desc and desc.get("content"):
-            unique_paragraphs = [desc["content"].strip()]
-
-    return title, unique_paragraphs
-
-
-def paginate_paragraphs(
-    paragraphs: Iterable[str], line_width: int = 22, max_lines_per_page: int = 20
-):
-    pages = []
-    current_lines = []
-    for paragraph in paragraphs:
-        lines = _wrap_text(paragraph, width=line_width)
-        needed = len(lines) + 1  # 加一行间距
-        if current_lines and len(current_lines) + needed > max_lines_per_page:
-            pages.append("\n".join(current_lines))
-            current_lines = []
-        current_lines.extend(lines)
-        current_lines.append("")
-
-    if current_lines:
-        pages.append("\n".join(current_lines).strip())
-    return pages
-
-
-def _draw_cover(title: str, domain: str, out_path: str):
-    img = Image.new("RGB", (CANVAS_WIDTH, CANVAS_HEIGHT), color=(250, 244, 235))
+def fetch_article(url: str, timeout: int = 20, backend: str = "auto"):
+    with stage("download"):
+        resp = http_fetch(url, timeout=timeout)
+    with stage("parse"):
+        resp.encoding = resp.apparent_encoding or resp.encoding
+        return extract_article(resp.text, backend=backend)
+
+
+def paginate_paragraphs(paragraphs: Iterable[str], max_lines_per_page: int = 18, font=None, max_width=BODY_WIDTH):
+    # 按真实字宽换行并逐行填满每页，返回每页的文本（行之间用换行符分隔）
+    font = font or load_font(40)
+    pages = paginate_lines(paragraphs, font, max_width, max_lines_per_page)
+    return ["\n".join(lines) for lines in pages]
+
+
+# 配色主题：新增主题只需加一组颜色，静态图层按主题各栅格化一次
+THEMES = {
+    "warm": {
+        "name": "暖橙",
+        "cover_bg": (250, 244, 235),
+        "cover_blobs": ((255, 220, 175), (255, 207, 140)),
+        "accent": (227, 76, 60),
+        "card": (255, 255, 255),
+        "label": (255, 255, 255),
+        "cover_title": (42, 39, 34),
+        "cover_sub": (105, 99, 92),
+        "page_bg": (248, 248, 246),
+        "page_header": (255, 255, 255),
+        "page_rule": (222, 222, 220),
+        "page_label": (54, 54, 52),
+        "page_no": (130, 130, 128),
+        "page_title": (30, 30, 28),
+        "body": (65, 65, 62),
+        "footer": (150, 150, 148),
+    },
+    "mint": {
+        "name": "薄荷绿",
+        "cover_bg": (236, 247, 241),
+        "cover_blobs": ((196, 235, 212), (165, 221, 190)),
+        "accent": (38, 140, 96),
+        "card": (255, 255, 255),
+        "label": (255, 255, 255),
+        "cover_title": (28, 48, 40),
+        "cover_sub": (88, 110, 100),
+        "page_bg": (245, 250, 247),
+        "page_header": (255, 255, 255),
+        "page_rule": (212, 230, 220),
+        "page_label": (38, 70, 56),
+        "page_no": (120, 140, 130),
+        "page_title": (24, 40, 33),
+        "body": (56, 70, 64),
+        "footer": (140, 160, 150),
+    },
+    "ink": {
+        "name": "墨黑",
+        "cover_bg": (238, 238, 236),
+        "cover_blobs": ((220, 220, 216), (205, 205, 200)),
+        "accent": (34, 34, 34),
+        "card": (255, 255, 255),
+        "label": (255, 255, 255),
+        "cover_title": (20, 20, 20),
+        "cover_sub": (100, 100, 100),
+        "page_bg": (250, 250, 250),
+        "page_header": (255, 255, 255),
+        "page_rule": (220, 220, 220),
+        "page_label": (34, 34, 34),
+        "page_no": (120, 120, 120),
+        "page_title": (20, 20, 20),
+        "body": (50, 50, 50),
+        "footer": (150, 150, 150),
+    },
+}
+DEFAULT_THEME = "warm"
+
+
+@lru_cache(maxsize=None)
+def _cover_template(theme: str):
+    colors = THEMES[theme]
+    img = Image.new("RGB", (CANVAS_WIDTH, CANVAS_HEIGHT), color=colors["cover_bg"])
     draw = ImageDraw.Draw(img)
 
     # 轻量背景层次
-    draw.ellipse((-220, -180, 620, 660), fill=(255, 220, 175))
-    draw.ellipse((580, 820, 1320, 1700), fill=(255, 207, 140))
-    draw.rectangle((0, 0, CANVAS_WIDTH, 130), fill=(227, 76, 60))
-
-    title_font = _load_font(72, bold=True)
-    sub_font = _load_font(36)
-    label_font = _load_font(34)
+    draw.ellipse((-220, -180, 620, 660), fill=colors["cover_blobs"][0])
+    draw.ellipse((580, 820, 1320, 1700), fill=colors["cover_blobs"][1])
+    draw.rectangle((0, 0, CANVAS_WIDTH, 130), fill=colors["accent"])
 
     card_left = 70
     card_top = 260
@@ -142,90 +154,286 @@ def _draw_cover(title: str, domain: str, out_path: str):
     draw.rounded_rectangle(
         (card_left, card_top, card_right, card_bottom),
         radius=34,
-        fill=(255, 255, 255),
+        fill=colors["card"],
     )
 
-    draw.text((100, 70), "小红书图文稿", font=label_font, fill=(255, 255, 255))
-    wrapped_title = _wrap_text(title, width=14)
-    y = 360
-    for line in wrapped_title[:8]:
-        draw.text((110, y), line, font=title_font, fill=(42, 39, 34))
-        y += 88
-
-    draw.text((110, CANVAS_HEIGHT - 250), f"来源：{domain}", font=sub_font, fill=(105, 99, 92))
-    draw.text((110, CANVAS_HEIGHT - 200), "保存图片即可发布", font=sub_font, fill=(227, 76, 60))
-    img.save(out_path)
+    sub_font = load_font(36)
+    draw.text((100, 70), "小红书图文稿", font=load_font(34), fill=colors["label"])
+    draw.text((110, CANVAS_HEIGHT - 200), "保存图片即可发布", font=sub_font, fill=colors["accent"])
+    return img
 
 
-def _draw_content_page(title: str, content: str, page_no: int, total_pages: int, out_path: str):
-    img = Image.new("RGB", (CANVAS_WIDTH, CANVAS_HEIGHT), color=(248, 248, 246))
+@lru_cache(maxsize=None)
+def _content_template(theme: str):
+    colors = THEMES[theme]
+    img = Image.new("RGB", (CANVAS_WIDTH, CANVAS_HEIGHT), color=colors["page_bg"])
     draw = ImageDraw.Draw(img)
 
-    title_font = _load_font(42, bold=True)
-    body_font = _load_font(40)
-    foot_font = _load_font(30)
+    draw.rectangle((0, 0, CANVAS_WIDTH, 130), fill=colors["page_header"])
+    draw.line((70, 130, CANVAS_WIDTH - 70, 130), fill=colors["page_rule"], width=2)
+    draw.text((70, 46), "笔记正文", font=load_font(42, bold=True), fill=colors["page_label"])
+    draw.text((PADDING_X, CANVAS_HEIGHT - 70), "由 AI 工具箱自动生成", font=load_font(30), fill=colors["footer"])
+    return img
 
-    draw.rectangle((0, 0, CANVAS_WIDTH, 130), fill=(255, 255, 255))
-    draw.line((70, 130, CANVAS_WIDTH - 70, 130), fill=(222, 222, 220), width=2)
-    draw.text((70, 46), "笔记正文", font=title_font, fill=(54, 54, 52))
-    draw.text((CANVAS_WIDTH - 260, 52), f"{page_no}/{total_pages}", font=foot_font, fill=(130, 130, 128))
 
-    title_lines = _wrap_text(title, width=20)[:2]
-    y = PADDING_TOP
-    for line in title_lines:
-        draw.text((PADDING_X, y), line, font=title_font, fill=(30, 30, 28))
-        y += 56
-    y += 24
+def _draw_cover(title: str, domain: str, theme: str = DEFAULT_THEME):
+    # 从缓存的静态底图复制，只绘制标题和来源
+    colors = THEMES[theme]
+    img = _cover_template(theme).copy()
+    draw = ImageDraw.Draw(img)
+
+    title_font = load_font(72, bold=True)
+    wrapped_title = _wrap_title(title, title_font, COVER_TITLE_WIDTH, COVER_TITLE_MAX_LINES)
+    y = 360
+    for line in wrapped_title:
+        draw.text((COVER_TITLE_X, y), line, font=title_font, fill=colors["cover_title"])
+        y += 88
 
-    body_lines = content.split("\n")
-    line_h = 56
-    for line in body_lines:
-        draw.text((PADDING_X, y), line, font=body_font, fill=(65, 65, 62))
-        y += line_h
-        if y > CANVAS_HEIGHT - PADDING_BOTTOM:
-            break
+    draw.text((110, CANVAS_HEIGHT - 250), f"来源：{domain}", font=load_font(36), fill=colors["cover_sub"])
+    return img
 
-    draw.text((PADDING_X, CANVAS_HEIGHT - 70), "由 AI 工具箱自动生成", font=foot_font, fill=(150, 150, 148))
-    img.save(out_path)
 
+def _draw_content_page(title: str, content: str, page_no: int, total_pages: int, theme: str = DEFAULT_THEME):
+    colors = THEMES[theme]
+    img = _content_template(theme).copy()
+    draw = ImageDraw.Draw(img)
 
-def build_xhs_images(title: str, paragraphs: Iterable[str], domain: str, max_pages: int = 8):
-    temp_dir = tempfile.mkdtemp()
+    title_font = load_font(42, bold=True)
+    body_font = load_font(40)
+    draw.text((CANVAS_WIDTH - 260, 52), f"{page_no}/{total_pages}", font=load_font(30), fill=colors["page_no"])
 
-    pages = paginate_paragraphs(paragraphs, line_width=22, max_lines_per_page=18)
+    title_lines, body_top, _ = _content_layout(title)
+    y = PADDING_TOP
+    for line in title_lines:
+        draw.text((PADDING_X, y), line, font=title_font, fill=colors["page_title"])
+        y += PAGE_TITLE_LINE_HEIGHT
+
+    # 分页时已按本页容量排好行，这里逐行绘制，不会越界也不会丢行
+    y = body_top
+    for line in content.split("\n"):
+        draw.text((PADDING_X, y), line, font=body_font, fill=colors["body"])
+        y += BODY_LINE_HEIGHT
+    return img
+
+
+def _encode_options(image_format: str, quality: int, compress_level: int):
+    if image_format == "PNG":
+        return {"compress_level": compress_level}
+    if image_format == "JPEG":
+        return {"quality": quality, "optimize": True}
+    return {"quality": quality, "method": 4}
+
+
+def _render_page_job(job, image_format, options):
+    name, draw, kwargs = job
+    return encode_image(draw(**kwargs), name, format=image_format, **options)
+
+
+def iter_xhs_artifacts(
+    title: str,
+    paragraphs: Iterable[str],
+    domain: str,
+    max_pages: int = 8,
+    workers: int = DEFAULT_RENDER_WORKERS,
+    image_format: str = "PNG",
+    quality: int = 90,
+    compress_level: int = 6,
+    theme: str = DEFAULT_THEME,
+):
+    # 先完成全部排版，再把绘制和编码分发给线程池（Pillow 编码时释放 GIL），按页序逐张产出
+    _, _, lines_per_page = _content_layout(title)
+    pages = paginate_paragraphs(paragraphs, max_lines_per_page=lines_per_page)
     if not pages:
         pages = ["未提取到正文，请更换链接或手动整理内容。"]
-
     pages = pages[:max_pages]
-    image_paths = []
-
-    cover_path = os.path.join(temp_dir, "01_cover.png")
-    _draw_cover(title=title, domain=domain or "未知来源", out_path=cover_path)
-    image_paths.append(cover_path)
 
+    suffix = OUTPUT_FORMATS[image_format]
+    jobs = [(f"01_cover{suffix}", _draw_cover, {"title": title, "domain": domain or "未知来源", "theme": theme})]
     total = len(pages)
     for idx, page_text in enumerate(pages, start=1):
-        page_path = os.path.join(temp_dir, f"{idx + 1:02d}_content.png")
-        _draw_content_page(title=title, content=page_text, page_no=idx, total_pages=total, out_path=page_path)
-        image_paths.append(page_path)
-    return image_paths, temp_dir
+        jobs.append((
+            f"{idx + 1:02d}_content{suffix}",
+            _draw_content_page,
+            {"title": title, "content": page_text, "page_no": idx, "total_pages": total, "theme": theme},
+        ))
 
+    options = _encode_options(image_format, quality, compress_level)
+    if workers <= 1:
+        for job in jobs:
+            yield _render_page_job(job, image_format, options)
+        return
+    with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        yield from pool.map(lambda job: _render_page_job(job, image_format, options), jobs)
 
-def zip_images(image_paths):
-    buffer = BytesIO()
-    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-        for path in image_paths:
-            zipf.write(path, arcname=os.path.basename(path))
-    buffer.seek(0)
-    return buffer
 
+def build_xhs_artifacts(title: str, paragraphs: Iterable[str], domain: str, max_pages: int = 8, **render_options):
+    return list(iter_xhs_artifacts(title, paragraphs, domain, max_pages=max_pages, **render_options))
 
-def run_article_to_xhs_app():
-    st.title("📝 文章链接转小红书图片")
-    st.markdown("输入文章链接，自动提取正文并生成适合发布的小红书图片。")
 
+def build_xhs_images(
+    title: str, paragraphs: Iterable[str], domain: str, max_pages: int = 8, session_id: str = None
+):
+    scratch = create_scratch_dir(session_id=session_id, prefix="xhs_")
+    artifacts = build_xhs_artifacts(title=title, paragraphs=paragraphs, domain=domain, max_pages=max_pages)
+    image_paths = [artifact.save(scratch.path) for artifact in artifacts]
+    return image_paths, scratch
+
+
+# ====== 批量模式 ======
+class HostLimiter:
+    # 每个站点同时进行的请求数上限，避免批量任务把单个站点打满
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def get(self, host: str):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+
+def parse_url_list(text: str):
+    # 支持每行一个链接，也支持 CSV（任意列中以 http(s):// 开头的单元格）；保持顺序去重
+    urls = []
+    for row in csv.reader(io.StringIO(text)):
+        for cell in row:
+            for token in cell.split():
+                if token.startswith(("http://", "https://")):
+                    urls.append(token.strip())
+    return list(dict.fromkeys(urls))
+
+
+def _process_batch_item(url: str, host_limiter: HostLimiter, max_pages: int, backend: str, render_options):
+    domain = urlparse(url).netloc or "未知来源"
+    with host_limiter.get(domain):
+        title, paragraphs = fetch_article(url, backend=backend)
+    if not paragraphs:
+        raise ValueError("未提取到可用正文")
+    # 批量模式下各篇文章之间并行，单篇内部串行渲染
+    artifacts = build_xhs_artifacts(title, paragraphs, domain, max_pages=max_pages, workers=1, **render_options)
+    return title, artifacts
+
+
+def iter_xhs_batch(
+    urls: Iterable[str],
+    max_pages: int = 6,
+    backend: str = "auto",
+    workers: int = 4,
+    per_host: int = 2,
+    **render_options,
+):
+    # 有界流水线：最多 workers * 2 篇文章在途，按完成顺序产出
+    # {"index", "url", "title", "artifacts", "error"}
+    urls = list(urls)
+    host_limiter = HostLimiter(per_host)
+    max_in_flight = max(1, workers) * 2
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = {}
+        next_index = 0
+        while next_index < len(urls) or pending:
+            while next_index < len(urls) and len(pending) < max_in_flight:
+                url = urls[next_index]
+                future = pool.submit(_process_batch_item, url, host_limiter, max_pages, backend, render_options)
+                pending[future] = (next_index, url)
+                next_index += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, url = pending.pop(future)
+                try:
+                    title, artifacts = future.result()
+                except Exception as exc:
+                    yield {"index": index, "url": url, "title": None, "artifacts": [], "error": str(exc)}
+                else:
+                    yield {"index": index, "url": url, "title": title, "artifacts": artifacts, "error": None}
+
+
+# ====== 后台任务 ======
+def run_xhs_job(job, params):
+    # 后台任务：抓取一篇文章并渲染，图片写入任务目录并同步打包 ZIP
+    job.progress(0.0, "正在抓取文章内容...")
+    title, paragraphs = fetch_article(params["url"], backend=params["backend"])
+    if not paragraphs:
+        raise ValueError("未提取到可用正文，请尝试更换链接。")
+    domain = urlparse(params["url"]).netloc or "未知来源"
+
+    # 封面 + 最多 max_pages 页正文，按上限估算进度
+    total = params["max_pages"] + 1
+    archive_name = f"{_safe_filename(title)[:30]}_xhs_images.zip"
+    artifacts = iter_xhs_artifacts(title, paragraphs, domain, max_pages=params["max_pages"], **params["render"])
+    with open(job.output_path(archive_name), "wb") as f, ArchiveBuilder(f) as archive:
+        for i, artifact in enumerate(artifacts, start=1):
+            artifact.save(job.output_dir)
+            job.add_output(artifact.name)
+            archive.add(artifact)
+            job.progress(i / total, f"已生成 {i} 张图片")
+    job.set_archive(archive_name)
+    return {"title": title, "domain": domain}
+
+
+def run_xhs_batch_job(job, params):
+    # 后台任务：批量处理，逐条状态写入任务记录（extra["items"]），全部图片打进同一个 ZIP；
+    # 并发数（workers、per_host）在 job.options 中，不参与任务 id
+    urls = params["urls"]
+    items = [{"url": url, "status": "pending", "title": None, "count": 0, "error": None} for url in urls]
+    batch = iter_xhs_batch(
+        urls,
+        max_pages=params["max_pages"],
+        backend=params["backend"],
+        **job.options,
+        **params["render"],
+    )
+    archive_name = "xhs_batch_images.zip"
+    done = 0
+    with open(job.output_path(archive_name), "wb") as f, ArchiveBuilder(f) as archive:
+        for item in batch:
+            done += 1
+            entry = items[item["index"]]
+            if item["error"]:
+                entry.update(status="failed", error=item["error"])
+            else:
+                # 每篇文章一个文件夹，写入后即释放图片
+                folder = f"{item['index'] + 1:02d}_{_safe_filename(item['title'])[:30]}"
+                for artifact in item["artifacts"]:
+                    archive.add(artifact, folder=folder)
+                entry.update(status="done", title=item["title"], count=len(item["artifacts"]))
+            job.progress(done / len(urls), f"{done} / {len(urls)}", items=items)
+    if any(entry["status"] == "done" for entry in items):
+        job.set_archive(archive_name)
+
+
+def _show_xhs_job(job_id, record):
+    if record is None:
+        st.info("任务结果已被清理，请重新生成。")
+        return
+    if record["status"] == "failed":
+        st.error(f"生成失败：{record['error']}")
+        return
+    manager = get_job_manager()
+    info = manager.load_result(job_id) or {}
+    st.success(f"已生成 {len(record['outputs'])} 张图片。")
+    st.caption(f"文章标题：{info.get('title', '')}")
+    st.caption(f"来源站点：{info.get('domain', '')}")
+    for i, name in enumerate(record["outputs"], start=1):
+        st.image(manager.output_path(job_id, name), caption=f"第 {i} 张", use_container_width=True)
+    with open(manager.output_path(job_id, record["archive"]), "rb") as zip_file:
+        st.download_button(
+            "📦 下载全部图片（ZIP）",
+            data=zip_file,
+            file_name=record["archive"],
+            mime="application/zip",
+        )
+
+
+def _run_single(options):
     article_url = st.text_input("文章链接", placeholder="https://example.com/article")
-    max_pages = st.slider("最多正文图片页数", min_value=2, max_value=12, value=6, step=1)
+    params = {
+        "url": article_url.strip(),
+        "backend": options["backend"],
+        "max_pages": options["max_pages"],
+        "render": options["render"],
+    }
 
     if st.button("生成小红书图片", key="article_to_xhs"):
         if not article_url.strip():
@@ -234,37 +442,116 @@ def run_article_to_xhs_app():
         if not article_url.startswith(("http://", "https://")):
             st.warning("链接格式不正确，请以 http:// 或 https:// 开头。")
             return
+        # 同一链接和参数在 HTTP 缓存有效期内直接复用已完成的任务
+        st.session_state["xhs_job"] = submit_job("article_to_xhs", params, max_age=HTTP_CACHE_TTL)
+
+    job_id = st.session_state.get("xhs_job")
+    if job_id is not None and job_id == job_id_for("article_to_xhs", params):
+        with track_request("article_to_xhs", job=job_id, backend=options["backend"], **options["render"]):
+            with stage("job_wait"):
+                record = wait_for_job(job_id)
+            with stage("transfer"):
+                _show_xhs_job(job_id, record)
+
+
+def _run_batch(options):
+    url_text = st.text_area("文章链接（每行一个）", height=180, placeholder="https://example.com/a\nhttps://example.com/b")
+    url_file = st.file_uploader("或上传链接列表（TXT / CSV）", type=["txt", "csv"])
+    col1, col2 = st.columns(2)
+    workers = col1.number_input("同时处理的文章数", min_value=1, max_value=16, value=4, step=1)
+    per_host = col2.number_input("每个站点并发请求数", min_value=1, max_value=8, value=2, step=1)
+
+    text = url_text
+    if url_file is not None:
+        text += "\n" + url_file.getvalue().decode("utf-8-sig", errors="replace")
+    urls = parse_url_list(text)
+    params = {
+        "urls": urls,
+        "backend": options["backend"],
+        "max_pages": options["max_pages"],
+        "render": options["render"],
+    }
+
+    if st.button("批量生成", key="article_to_xhs_batch"):
+        if not urls:
+            st.warning("没有找到有效链接（需以 http:// 或 https:// 开头）。")
+            return
+        st.session_state["xhs_batch_job"] = submit_job(
+            "article_to_xhs_batch", params, max_age=HTTP_CACHE_TTL,
+            options={"workers": int(workers), "per_host": int(per_host)},
+        )
+
+    job_id = st.session_state.get("xhs_batch_job")
+    if job_id is None or job_id != job_id_for("article_to_xhs_batch", params):
+        return
+
+    rows = [st.empty() for _ in urls]
+
+    def show_items(record):
+        items = record["extra"].get("items") or [{"url": url, "status": "pending"} for url in urls]
+        for row, item in zip(rows, items):
+            if item["status"] == "done":
+                row.success(f"✅ {item['title']}（{item['count']} 张）")
+            elif item["status"] == "failed":
+                row.error(f"❌ {item['url']}：{item['error']}")
+            else:
+                row.caption(f"⏳ {item['url']}")
+
+    with track_request("article_to_xhs_batch", job=job_id, urls=len(urls), workers=int(workers)):
+        with stage("job_wait"):
+            record = wait_for_job(job_id, on_update=show_items)
+        if record is None:
+            st.info("任务结果已被清理，请重新生成。")
+            return
+        if record["status"] == "failed":
+            st.error(f"批量生成失败：{record['error']}")
+            return
 
-        try:
-            with st.spinner("正在抓取文章内容..."):
-                title, paragraphs = fetch_article(article_url)
-            if not paragraphs:
-                st.error("未提取到可用正文，请尝试更换链接。")
-                return
-
-            parsed = urlparse(article_url)
-            domain = parsed.netloc or "未知来源"
-            with st.spinner("正在生成图片..."):
-                image_paths, _ = build_xhs_images(
-                    title=title,
-                    paragraphs=paragraphs,
-                    domain=domain,
-                    max_pages=max_pages,
+        items = record["extra"].get("items", [])
+        failed = sum(item["status"] == "failed" for item in items)
+        st.info(f"完成 {len(items) - failed} 篇，失败 {failed} 篇。")
+        if record["archive"]:
+            with stage("transfer"), open(get_job_manager().output_path(job_id, record["archive"]), "rb") as zip_file:
+                st.download_button(
+                    "📦 下载全部文章图片（ZIP）",
+                    data=zip_file,
+                    file_name=record["archive"],
+                    mime="application/zip",
                 )
 
-            st.success(f"已生成 {len(image_paths)} 张图片。")
-            st.caption(f"文章标题：{title}")
-            st.caption(f"来源站点：{domain}")
-
-            for i, path in enumerate(image_paths, start=1):
-                st.image(path, caption=f"第 {i} 张", use_container_width=True)
-
-            archive_name = f"{_safe_filename(title)[:30]}_xhs_images.zip"
-            st.download_button(
-                "📦 下载全部图片（ZIP）",
-                data=zip_images(image_paths),
-                file_name=archive_name,
-                mime="application/zip",
-            )
-        except Exception as e:
-            st.error(f"生成失败：{e}")
+
+def run_article_to_xhs_app():
+    st.title("📝 文章链接转小红书图片")
+    st.markdown("输入文章链接，自动提取正文并生成适合发布的小红书图片。")
+
+    max_pages = st.slider("最多正文图片页数", min_value=2, max_value=12, value=6, step=1)
+    backend = st.selectbox(
+        "正文提取引擎",
+        ["auto", *EXTRACTORS],
+        format_func=lambda b: {"auto": "自动", "density": "文本密度（lxml）", "selectors": "CSS 选择器"}.get(b, b),
+    )
+    theme = st.selectbox("配色主题", list(THEMES), format_func=lambda t: THEMES[t]["name"])
+    col1, col2 = st.columns(2)
+    image_format = col1.selectbox("图片格式", list(OUTPUT_FORMATS), help="JPEG / WebP 体积更小、编码更快。")
+    if image_format == "PNG":
+        compress_level = col2.slider("PNG 压缩级别", min_value=0, max_value=9, value=6, help="越低编码越快、文件越大。")
+        quality = 90
+    else:
+        quality = col2.slider("图片质量", min_value=50, max_value=100, value=90, step=5)
+        compress_level = 6
+
+    options = {
+        "max_pages": max_pages,
+        "backend": backend,
+        "render": {
+            "image_format": image_format,
+            "quality": quality,
+            "compress_level": compress_level,
+            "theme": theme,
+        },
+    }
+    tab_single, tab_batch = st.tabs(["🔗 单篇", "📚 批量"])
+    with tab_single:
+        _run_single(options)
+    with tab_batch:
+        _run_batch(options)
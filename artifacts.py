@@ -0,0 +1,45 @@
+import os
+import struct
+from dataclasses import dataclass
+from io import BytesIO
+
+
+MIME_TYPES = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+
+# 已编码的图片：预览、ZIP 打包和下载共用同一份字节
+@dataclass
+class ImageArtifact:
+    name: str
+    data: bytes
+    width: int
+    height: int
+    mime: str = "image/png"
+
+    def save(self, directory):
+        path = os.path.join(directory, self.name)
+        with open(path, "wb") as f:
+            f.write(self.data)
+        return path
+
+
+def encode_image(img, name, format="PNG", **params):
+    buffer = BytesIO()
+    img.save(buffer, format=format, **params)
+    return ImageArtifact(
+        name=name,
+        data=buffer.getvalue(),
+        width=img.width,
+        height=img.height,
+        mime=MIME_TYPES.get(format.upper(), "application/octet-stream"),
+    )
+
+
+def png_artifact(name, data):
+    # 直接从 IHDR 读取宽高，缓存命中时无需解码 PNG
+    width, height = struct.unpack(">II", data[16:24])
+    return ImageArtifact(name=name, data=data, width=width, height=height)
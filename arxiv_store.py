@@ -0,0 +1,231 @@
+import datetime as dt
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from app_dirs import cache_dir
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id TEXT PRIMARY KEY,
+    day TEXT NOT NULL,
+    title TEXT NOT NULL,
+    authors TEXT NOT NULL,
+    published TEXT NOT NULL,
+    url TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    primary_category TEXT
+);
+CREATE INDEX IF NOT EXISTS papers_day ON papers (day);
+CREATE TABLE IF NOT EXISTS paper_categories (
+    id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    PRIMARY KEY (category, id)
+);
+CREATE TABLE IF NOT EXISTS synced_days (
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    max_results INTEGER NOT NULL,
+    complete INTEGER NOT NULL,
+    final INTEGER NOT NULL,
+    synced_at TEXT NOT NULL,
+    PRIMARY KEY (day, category)
+);
+"""
+
+# 外部内容 FTS5 索引，由触发器随 papers 表增量更新
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+    title, authors, summary, content='papers', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS papers_fts_ai AFTER INSERT ON papers BEGIN
+    INSERT INTO papers_fts (rowid, title, authors, summary)
+    VALUES (new.rowid, new.title, new.authors, new.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_fts_ad AFTER DELETE ON papers BEGIN
+    INSERT INTO papers_fts (papers_fts, rowid, title, authors, summary)
+    VALUES ('delete', old.rowid, old.title, old.authors, old.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_fts_au AFTER UPDATE ON papers BEGIN
+    INSERT INTO papers_fts (papers_fts, rowid, title, authors, summary)
+    VALUES ('delete', old.rowid, old.title, old.authors, old.summary);
+    INSERT INTO papers_fts (rowid, title, authors, summary)
+    VALUES (new.rowid, new.title, new.authors, new.summary);
+END;
+"""
+
+# bm25 权重：标题 > 作者 > 摘要
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+def default_store_path():
+    return os.path.join(cache_dir("arxiv"), "arxiv.sqlite3")
+
+
+# 本地 arXiv 元数据库：按 arXiv id 存论文，按 (北京日期, 类别) 记录同步状态
+class ArxivStore:
+    def __init__(self, path=None):
+        self.path = path or default_store_path()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            self.fts_enabled = self._init_fts(conn)
+
+    @staticmethod
+    def _init_fts(conn):
+        existed = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'papers_fts'"
+        ).fetchone()
+        try:
+            conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            # 当前 SQLite 未编译 FTS5，搜索退化为 LIKE 匹配
+            return False
+        if not existed:
+            conn.execute("INSERT INTO papers_fts (papers_fts) VALUES ('rebuild')")
+        return True
+
+    @contextmanager
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        with conn:
+            yield conn
+
+    def fresh_categories(self, day: dt.date, categories, max_results):
+        # 已定稿且（抓全了或当时的上限不小于本次）的类别可以直接读本地
+        placeholders = ",".join("?" * len(categories))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT category, max_results, complete FROM synced_days "
+                f"WHERE day = ? AND final = 1 AND category IN ({placeholders})",
+                [day.isoformat(), *categories],
+            ).fetchall()
+        return {
+            row["category"] for row in rows
+            if row["complete"] or row["max_results"] >= max_results
+        }
+
+    def load_day(self, day: dt.date, category, limit=None):
+        sql = (
+            "SELECT p.* FROM papers p JOIN paper_categories c ON c.id = p.id "
+            "WHERE c.category = ? AND p.day = ? ORDER BY p.published DESC"
+        )
+        params = [category, day.isoformat()]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+            ids = [row["id"] for row in rows]
+            categories = self._categories_for(conn, ids)
+        return [self._paper_from_row(row, categories.get(row["id"], [])) for row in rows]
+
+    def _categories_for(self, conn, ids):
+        result = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row in conn.execute(
+                f"SELECT id, category FROM paper_categories WHERE id IN ({placeholders})", chunk
+            ):
+                result.setdefault(row["id"], []).append(row["category"])
+        return result
+
+    @staticmethod
+    def _paper_from_row(row, categories):
+        return {
+            "id": row["id"],
+            "categories": categories,
+            "primary_category": row["primary_category"],
+            "title": row["title"],
+            "authors": row["authors"],
+            "published": dt.datetime.fromisoformat(row["published"]),
+            "url": row["url"],
+            "summary": row["summary"],
+        }
+
+    def save_papers(self, day: dt.date, papers):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO papers "
+                "(id, day, title, authors, published, url, summary, primary_category) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET day = excluded.day, title = excluded.title, "
+                "authors = excluded.authors, published = excluded.published, url = excluded.url, "
+                "summary = excluded.summary, primary_category = excluded.primary_category",
+                [
+                    (
+                        p["id"], day.isoformat(), p["title"], p["authors"], p["published"].isoformat(),
+                        p["url"], p["summary"], p.get("primary_category"),
+                    )
+                    for p in papers
+                ],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO paper_categories (id, category) VALUES (?, ?)",
+                [(p["id"], cat) for p in papers for cat in p.get("categories", ())],
+            )
+
+    def mark_synced(self, day: dt.date, category, max_results, complete, final):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO synced_days "
+                "(day, category, max_results, complete, final, synced_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    day.isoformat(), category, int(max_results), int(bool(complete)), int(bool(final)),
+                    dt.datetime.now(dt.timezone.utc).isoformat(),
+                ),
+            )
+
+    def search(self, text, categories=None, day_from: dt.date = None, day_to: dt.date = None, limit=50):
+        terms = re.findall(r"\w+", text or "")
+        if not terms:
+            return []
+
+        filters = []
+        params = []
+        if categories:
+            placeholders = ",".join("?" * len(categories))
+            filters.append(
+                f"p.id IN (SELECT id FROM paper_categories WHERE category IN ({placeholders}))"
+            )
+            params.extend(categories)
+        if day_from is not None:
+            filters.append("p.day >= ?")
+            params.append(day_from.isoformat())
+        if day_to is not None:
+            filters.append("p.day <= ?")
+            params.append(day_to.isoformat())
+
+        if self.fts_enabled:
+            # 每个词都加引号并做前缀匹配，避免用户输入被当成 FTS 语法
+            match = " ".join(f'"{term}"*' for term in terms)
+            weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+            sql = (
+                f"SELECT p.* FROM papers_fts f JOIN papers p ON p.rowid = f.rowid "
+                f"WHERE papers_fts MATCH ?{''.join(' AND ' + c for c in filters)} "
+                f"ORDER BY bm25(papers_fts, {weights}) LIMIT ?"
+            )
+            params = [match, *params, int(limit)]
+        else:
+            for term in terms:
+                filters.append("(p.title LIKE ? OR p.authors LIKE ? OR p.summary LIKE ?)")
+                params.extend([f"%{term}%"] * 3)
+            sql = (
+                f"SELECT p.* FROM papers p WHERE {' AND '.join(filters)} "
+                f"ORDER BY p.published DESC LIMIT ?"
+            )
+            params.append(int(limit))
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+            categories_by_id = self._categories_for(conn, [row["id"] for row in rows])
+        return [self._paper_from_row(row, categories_by_id.get(row["id"], [])) for row in rows]
@@ -1,12 +1,102 @@
 import datetime as dt
+import os
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from zoneinfo import ZoneInfo
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 import arxiv
 import streamlit as st
 
+from app_dirs import cache_dir
+from arxiv_store import ArxivStore
+from instrumentation import stage, track_request
+from jobs import get_job_manager, submit_job, wait_for_job
+
 
 BEIJING_TZ = ZoneInfo("Asia/Shanghai")
+# arXiv API 要求每 3 秒不超过 1 次请求
+ARXIV_REQUEST_INTERVAL = 3.0
+DEFAULT_FETCH_WORKERS = 4
+COMBINED_PAGE_SIZE = 500
+ARXIV_SETTLE_DAYS = 2
+PAGE_SIZES = [10, 20, 50]
+# 尚未定稿的日期，后台抓取任务的结果复用时长
+ARXIV_JOB_TTL = 10 * 60
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK 重试约 10 秒后放弃，继续等
+            continue
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileRateLimiter:
+    # 跨进程限速：在文件锁保护下读写“下一次允许请求的时刻”，
+    # 服务进程和所有后台任务工作进程共用同一个间隔
+    def __init__(self, interval: float, directory=None):
+        self.interval = interval
+        self.directory = directory
+
+    def _reserve(self):
+        # 预约下一个空闲时刻并把它后移一个间隔，返回本次需要等待的秒数；等待时不持锁
+        directory = self.directory or cache_dir("arxiv")
+        with open(os.path.join(directory, "rate_limit.lock"), "a+b") as lock:
+            _lock_file(lock)
+            try:
+                slot_path = os.path.join(directory, "rate_limit_next")
+                try:
+                    with open(slot_path, encoding="utf-8") as f:
+                        next_slot = float(f.read())
+                except (FileNotFoundError, ValueError):
+                    next_slot = 0.0
+                now = time.time()
+                slot = max(now, next_slot)
+                with open(slot_path, "w", encoding="utf-8") as f:
+                    f.write(repr(slot + self.interval))
+                return slot - now
+            finally:
+                _unlock_file(lock)
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+# 所有进程（服务进程和各个任务工作进程）中的查询共用同一个限速
+_ARXIV_LIMITER = FileRateLimiter(ARXIV_REQUEST_INTERVAL)
+
+
+class _RateLimitedClient(arxiv.Client):
+    # 关闭客户端自带的固定间隔，每次翻页/重试前改由共享限速器放行
+    def __init__(self, limiter: FileRateLimiter, **kwargs):
+        super().__init__(delay_seconds=0, **kwargs)
+        self._limiter = limiter
+
+    def _parse_feed(self, url, first_page=True, _try_index=0):
+        self._limiter.acquire()
+        return super()._parse_feed(url, first_page=first_page, _try_index=_try_index)
 
 
 def _beijing_today():
@@ -21,33 +111,247 @@ def _day_window_utc(target_date: dt.date):
     return start_utc, end_utc
 
 
-def fetch_arxiv_for_date(categories, target_date: dt.date, max_results=200):
+def _arxiv_id(result):
+    # 去掉版本号，同一篇论文的不同版本视为同一条
+    short_id = result.get_short_id()
+    base, sep, version = short_id.rpartition("v")
+    return base if sep and version.isdigit() else short_id
+
+
+def _paper_from_result(result):
+    return {
+        "id": _arxiv_id(result),
+        "categories": list(result.categories),
+        "primary_category": result.primary_category,
+        "title": result.title.strip(),
+        "authors": ", ".join(a.name for a in result.authors),
+        "published": result.published,
+        "url": result.entry_id,
+        "summary": (result.summary or "").strip(),
+    }
+
+
+def _fetch_category(cat, from_ts, to_ts, max_results):
+    client = _RateLimitedClient(_ARXIV_LIMITER)
+    query = f"cat:{cat} AND submittedDate:[{from_ts} TO {to_ts}]"
+    search = arxiv.Search(
+        query=query,
+        max_results=max_results,
+        sort_by=arxiv.SortCriterion.SubmittedDate,
+        sort_order=arxiv.SortOrder.Descending,
+    )
+    return [_paper_from_result(result) for result in client.results(search)]
+
+
+def _fetch_combined(categories, from_ts, to_ts, max_results):
+    # 所有类别合成一个 OR 查询分页拉取，按 arXiv id 建索引，交叉投递的论文只保存一份
+    client = _RateLimitedClient(_ARXIV_LIMITER, page_size=COMBINED_PAGE_SIZE)
+    cat_query = " OR ".join(f"cat:{cat}" for cat in categories)
+    query = f"({cat_query}) AND submittedDate:[{from_ts} TO {to_ts}]"
+    search = arxiv.Search(
+        query=query,
+        max_results=max_results,
+        sort_by=arxiv.SortCriterion.SubmittedDate,
+        sort_order=arxiv.SortOrder.Descending,
+    )
+
+    papers_by_id = {}
+    papers_by_cat = {cat: [] for cat in categories}
+    total = 0
+    for result in client.results(search):
+        total += 1
+        paper = _paper_from_result(result)
+        if paper["id"] in papers_by_id:
+            continue
+        papers_by_id[paper["id"]] = paper
+        for cat in categories:
+            if cat in paper["categories"]:
+                papers_by_cat[cat].append(paper)
+    return papers_by_cat, total < max_results
+
+
+def home_category(paper, categories):
+    # 交叉投递的论文只在一个类别下展示：优先主类别，其次按所选顺序
+    if paper.get("primary_category") in categories:
+        return paper["primary_category"]
+    for cat in categories:
+        if cat in paper.get("categories", ()):
+            return cat
+    return None
+
+
+def _iter_remote(categories, target_date: dt.date, max_results, max_workers, combined):
+    # 产出 (类别, 论文列表, 是否已抓全)
     start_utc, end_utc = _day_window_utc(target_date)
     from_ts = start_utc.strftime("%Y%m%d%H%M")
     to_ts = end_utc.strftime("%Y%m%d%H%M")
 
+    if combined:
+        papers_by_cat, complete = _fetch_combined(categories, from_ts, to_ts, max_results * len(categories))
+        for cat, papers in papers_by_cat.items():
+            yield cat, papers, complete
+        return
+    # 各类别并发查询，哪个先完成就先产出
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(categories)))) as pool:
+        futures = {
+            pool.submit(_fetch_category, cat, from_ts, to_ts, max_results): cat
+            for cat in categories
+        }
+        for future in as_completed(futures):
+            papers = future.result()
+            yield futures[future], papers, len(papers) < max_results
+
+
+def _is_settled(target_date: dt.date):
+    # arXiv 公布有延迟，提交日之后的若干天内结果仍可能变化
+    return (_beijing_today() - target_date).days >= ARXIV_SETTLE_DAYS
+
+
+def iter_arxiv_for_date(
+    categories, target_date: dt.date, max_results=200, max_workers=DEFAULT_FETCH_WORKERS, combined=False,
+    store=None,
+):
+    categories = list(dict.fromkeys(categories))
+    if not categories:
+        return
+
+    # 本地已定稿的类别直接从数据库读取，只向 arXiv 请求缺失或仍在变化的部分
+    if store is not None:
+        fresh = store.fresh_categories(target_date, categories, max_results)
+        for cat in categories:
+            if cat in fresh:
+                yield cat, store.load_day(target_date, cat, limit=None if combined else max_results)
+        categories = [cat for cat in categories if cat not in fresh]
+        if not categories:
+            return
+
+    final = _is_settled(target_date)
+    for cat, papers, complete in _iter_remote(categories, target_date, max_results, max_workers, combined):
+        if store is not None:
+            store.save_papers(target_date, papers)
+            store.mark_synced(target_date, cat, max_results, complete, final)
+        yield cat, papers
+
+
+def fetch_arxiv_for_date(
+    categories, target_date: dt.date, max_results=200, max_workers=DEFAULT_FETCH_WORKERS, combined=False,
+    store=None,
+):
     papers_by_cat = defaultdict(list)
-    client = arxiv.Client()
+    for cat, papers in iter_arxiv_for_date(
+        categories, target_date, max_results=max_results, max_workers=max_workers, combined=combined,
+        store=store,
+    ):
+        papers_by_cat[cat].extend(papers)
+    return target_date, papers_by_cat
 
+
+def run_arxiv_job(job, params):
+    # 后台任务：抓取并整理好展示列表，结果通过 pickle 交回界面
+    categories = params["categories"]
+    target_date = dt.date.fromisoformat(params["date"])
+    papers_by_cat = {}
+    fetched = iter_arxiv_for_date(
+        categories=categories, target_date=target_date, max_results=params["max_results"],
+        combined=params["combined"], store=ArxivStore(),
+    )
+    for cat, papers in fetched:
+        papers_by_cat[cat] = papers
+        job.progress(
+            len(papers_by_cat) / len(categories),
+            "已完成：" + "，".join(f"{c} {len(p)} 篇" for c, p in papers_by_cat.items()),
+        )
+    return _build_view(categories, papers_by_cat, params["combined"])
+
+
+def _build_view(categories, papers_by_cat, combined):
+    # 抓取完成后一次性整理好每个类别的展示列表，翻页时直接切片
+    view = {}
     for cat in categories:
-        query = f"cat:{cat} AND submittedDate:[{from_ts} TO {to_ts}]"
-        search = arxiv.Search(
-            query=query,
-            max_results=max_results,
-            sort_by=arxiv.SortCriterion.SubmittedDate,
-            sort_order=arxiv.SortOrder.Descending,
+        papers = sorted(papers_by_cat.get(cat, []), key=lambda x: x["published"], reverse=True)
+        cross_listed = 0
+        if combined:
+            # 合并查询模式：交叉投递的论文只在其归属类别下展示一次
+            home = [p for p in papers if home_category(p, categories) == cat]
+            cross_listed = len(papers) - len(home)
+            papers = home
+        view[cat] = {"papers": papers, "cross_listed": cross_listed}
+    return view
+
+
+def _render_results(results):
+    categories = results["categories"]
+    view = results["view"]
+    st.success(f"抓取完成：{results['date'].isoformat()}（北京时间）")
+
+    cat = st.radio(
+        "类别",
+        categories,
+        horizontal=True,
+        format_func=lambda c: f"{c}（{len(view[c]['papers'])}）",
+        key="arxiv_view_cat",
+    )
+    papers = view[cat]["papers"]
+    if view[cat]["cross_listed"]:
+        st.caption(f"另有 {view[cat]['cross_listed']} 篇交叉投递已在其他类别展示。")
+    if not papers:
+        st.info("该类别在所选日期暂无结果。")
+        return
+
+    col1, col2 = st.columns(2)
+    page_size = col1.selectbox("每页篇数", PAGE_SIZES, index=1, key="arxiv_page_size")
+    page_count = (len(papers) + page_size - 1) // page_size
+    page = col2.number_input(
+        f"页码（共 {page_count} 页）", min_value=1, max_value=page_count, value=1, step=1,
+        key=f"arxiv_page_{cat}_{page_size}",
+    )
+    start = (page - 1) * page_size
+    for p in papers[start:start + page_size]:
+        also_in = [c for c in categories if c != cat and c in p.get("categories", ())] if results["combined"] else []
+        _render_paper(p, note=f"同时属于：{', '.join(also_in)}" if also_in else "")
+
+
+def _render_paper(p, note=""):
+    published_beijing = p["published"].astimezone(BEIJING_TZ)
+    st.markdown(f"**{p['title']}**")
+    note = f" | {note}" if note else ""
+    st.caption(
+        f"作者：{p['authors']} | 提交时间(北京时间)：{published_beijing:%Y-%m-%d %H:%M}{note}"
+    )
+    st.markdown(f"[论文链接]({p['url']})")
+    if p["summary"]:
+        with st.expander("摘要"):
+            st.write(p["summary"])
+    st.markdown("---")
+
+
+def _render_search(store, categories):
+    with st.expander("🔎 在已抓取的论文中搜索"):
+        query = st.text_input("关键词（标题 / 作者 / 摘要）", key="arxiv_search_query")
+        col1, col2 = st.columns(2)
+        day_from = col1.date_input("起始日期", value=None, key="arxiv_search_from")
+        day_to = col2.date_input("结束日期", value=None, key="arxiv_search_to")
+        only_selected = st.checkbox("仅搜索所选类别", value=True, key="arxiv_search_cats")
+        if not query.strip():
+            return
+
+        started = time.perf_counter()
+        results = store.search(
+            query,
+            categories=categories if only_selected else None,
+            day_from=day_from,
+            day_to=day_to,
+            limit=100,
         )
-        for result in client.results(search):
-            papers_by_cat[cat].append(
-                {
-                    "title": result.title.strip(),
-                    "authors": ", ".join(a.name for a in result.authors),
-                    "published": result.published,
-                    "url": result.entry_id,
-                    "summary": (result.summary or "").strip(),
-                }
-            )
-    return target_date, papers_by_cat
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        st.caption(f"找到 {len(results)} 篇（最多显示 100 篇，用时 {elapsed_ms:.0f} ms）")
+        for p in results:
+            _render_paper(p, note=f"类别：{', '.join(p['categories'])}")
+
+
+@st.cache_resource
+def _get_arxiv_store():
+    return ArxivStore()
 
 
 def run_arxiv_today_app():
@@ -58,32 +362,45 @@ def run_arxiv_today_app():
     categories = st.multiselect("选择类别", default_cats, default=default_cats)
     target_date = st.date_input("选择日期（北京时间）", value=_beijing_today(), max_value=_beijing_today())
     max_results = st.slider("每个类别最大抓取数", min_value=50, max_value=500, value=200, step=50)
+    combined = st.checkbox(
+        "合并查询并去重",
+        value=True,
+        help="所有类别合成一次查询，交叉投递的论文只下载和展示一次。",
+    )
+    _render_search(_get_arxiv_store(), categories)
 
     if st.button("获取所选日期论文", type="primary"):
         if not categories:
             st.warning("请至少选择一个类别。")
             return
-        try:
-            with st.spinner("正在抓取论文..."):
-                _, papers_by_cat = fetch_arxiv_for_date(categories=categories, target_date=target_date, max_results=max_results)
-
-            st.success(f"抓取完成：{target_date.isoformat()}（北京时间）")
-            for cat in categories:
-                papers = papers_by_cat.get(cat, [])
-                papers.sort(key=lambda x: x["published"], reverse=True)
-                st.subheader(f"{cat}（{len(papers)} 篇）")
-                if not papers:
-                    st.info("该类别在所选日期暂无结果。")
-                    continue
-                for p in papers:
-                    published_beijing = p["published"].astimezone(BEIJING_TZ)
-                    st.markdown(f"**{p['title']}**")
-                    st.caption(
-                        f"作者：{p['authors']} | 提交时间(北京时间)：{published_beijing:%Y-%m-%d %H:%M}"
-                    )
-                    st.markdown(f"[论文链接]({p['url']})")
-                    if p["summary"]:
-                        st.write(p["summary"])
-                    st.markdown("---")
-        except Exception as exc:
-            st.error(f"抓取失败：{exc}")
+        params = {
+            "categories": list(categories),
+            "date": target_date.isoformat(),
+            "max_results": max_results,
+            "combined": combined,
+        }
+        # 已定稿的日期结果不会再变，可一直复用；当天的结果只复用 ARXIV_JOB_TTL 秒
+        max_age = None if _is_settled(target_date) else ARXIV_JOB_TTL
+        st.session_state["arxiv_job"] = submit_job("arxiv_today", params, max_age=max_age)
+
+    job_id = st.session_state.get("arxiv_job")
+    if job_id is not None:
+        with track_request("arxiv_today", job=job_id, categories=len(categories), combined=combined):
+            with stage("job_wait"):
+                record = wait_for_job(job_id)
+            # 结果转存到会话中，之后翻页、切换类别等交互不再读取任务
+            del st.session_state["arxiv_job"]
+            if record is None or record["status"] == "failed":
+                st.error(f"抓取失败：{record['error'] if record else '任务结果已被清理'}")
+                return
+            params = record["params"]
+            st.session_state["arxiv_results"] = {
+                "date": dt.date.fromisoformat(params["date"]),
+                "categories": params["categories"],
+                "combined": params["combined"],
+                "view": get_job_manager().load_result(job_id),
+            }
+
+    results = st.session_state.get("arxiv_results")
+    if results:
+        _render_results(results)
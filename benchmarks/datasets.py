@@ -0,0 +1,109 @@
+import os
+import random
+
+import fitz
+import numpy as np
+from PIL import Image
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+_WORDS = (
+    "layout render stream cache page image archive font width parse extract paragraph "
+    "article document pixel buffer encode merge zoom rotate session worker pipeline"
+).split()
+_HANZI = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严"
+
+
+def _sentence(rng, hanzi=True, length=None):
+    if hanzi:
+        length = length or rng.randint(24, 80)
+        chars = [rng.choice(_HANZI) for _ in range(length)]
+        for i in range(rng.randint(8, 14), length - 1, rng.randint(8, 14)):
+            chars[i] = "，"
+        return "".join(chars) + "。"
+    length = length or rng.randint(8, 20)
+    return " ".join(rng.choice(_WORDS) for _ in range(length)).capitalize() + "."
+
+
+def make_paragraphs(count, seed=0, hanzi=True):
+    rng = random.Random(seed)
+    return [
+        "".join(_sentence(rng, hanzi) for _ in range(rng.randint(1, 4)))
+        for _ in range(count)
+    ]
+
+
+def make_pdf(path, pages, seed=0):
+    # 每页一段标题、若干正文行和几个色块，栅格化开销与真实文档相近
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_no in range(pages):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((56, 72), f"Benchmark document - page {page_no + 1}", fontsize=18)
+        y = 110
+        while y < 760:
+            page.insert_text((56, y), _sentence(rng, hanzi=False, length=rng.randint(10, 14)), fontsize=10)
+            y += 14
+        for _ in range(3):
+            x0, y0 = rng.randint(56, 400), rng.randint(120, 700)
+            color = (rng.random(), rng.random(), rng.random())
+            page.draw_rect(fitz.Rect(x0, y0, x0 + 120, y0 + 60), color=color, fill=color, fill_opacity=0.3)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return path
+
+
+def make_markdown(sections, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(sections):
+        lines.append(f"## Section {i + 1}")
+        lines.append("")
+        for _ in range(3):
+            lines.append(_sentence(rng, hanzi=False, length=40))
+        lines.append("- " + _sentence(rng, hanzi=False))
+        lines.append("- **" + _sentence(rng, hanzi=False) + "**")
+        lines.append("```")
+        lines.extend(f"value_{j} = compute({j})" for j in range(4))
+        lines.append("```")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def make_avatar(size, seed=0):
+    # 渐变加噪声的合成头像，避免纯色图让压缩和混合结果失真
+    w, h = size
+    rng = np.random.default_rng(seed)
+    xs = np.linspace(0, 255, w, dtype=np.float32)
+    ys = np.linspace(0, 255, h, dtype=np.float32)
+    arr = np.empty((h, w, 4), dtype=np.float32)
+    arr[..., 0] = xs[None, :]
+    arr[..., 1] = ys[:, None]
+    arr[..., 2] = (xs[None, :] + ys[:, None]) / 2
+    arr[..., :3] += rng.normal(0, 12, (h, w, 1)).astype(np.float32)
+    arr[..., 3] = 255
+    return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8), mode="RGBA")
+
+
+def load_html_fixtures():
+    fixtures = {}
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if name.endswith(".html"):
+            with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+                fixtures[os.path.splitext(name)[0]] = f.read()
+    return fixtures
+
+
+def make_long_html(paragraphs, seed=0):
+    # 大页面：正文段落混在导航、推荐和评论等噪声区块中
+    rng = random.Random(seed)
+    body = "\n".join(f"<p>{p}</p>" for p in make_paragraphs(paragraphs, seed=seed))
+    noise = "\n".join(
+        f'<div class="card"><p><a href="/item/{i}">{_sentence(rng)}</a></p></div>' for i in range(paragraphs // 2)
+    )
+    return (
+        "<html><head><meta charset='utf-8'><title>长文测试</title></head><body>"
+        f"<nav>{noise}</nav><div class='main'><div class='content'>{body}</div></div>"
+        f"<aside>{noise}</aside><footer><p>版权所有，转载请注明出处，感谢阅读。</p></footer></body></html>"
+    )
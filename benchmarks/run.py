@@ -0,0 +1,343 @@
+import argparse
+import datetime as dt
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不记录峰值内存
+    resource = None
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+if ROOT not in sys.path:
+    # 兼容 python benchmarks/run.py 直接运行
+    sys.path.insert(0, ROOT)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+DEFAULT_THRESHOLD = 0.15
+DEFAULT_RSS_THRESHOLD = 0.25
+# 峰值内存的绝对变化小于该值时不算回归，避免小进程的抖动误报
+MIN_RSS_DELTA_MB = 20
+
+
+class Case:
+    def __init__(self, name, setup, unit, repeat=3):
+        # setup(workdir) 准备输入并返回 run()，run() 返回本次处理的单位数（页 / 张 / 篇）
+        self.name = name
+        self.setup = setup
+        self.unit = unit
+        self.repeat = repeat
+
+
+def _pdf_case(pages, zoom, workers, pages_per_image=1):
+    def setup(workdir):
+        from benchmarks.datasets import make_pdf
+        from pdf2png import pdf_to_images
+
+        path = make_pdf(os.path.join(workdir, f"bench_{pages}.pdf"), pages)
+
+        def run():
+            _, scratch = pdf_to_images(
+                path, pages_per_image=pages_per_image, zoom_x=zoom, zoom_y=zoom, workers=workers
+            )
+            scratch.cleanup()
+            return pages
+        return run
+    return setup
+
+
+def _xhs_case(paragraphs, image_format, max_pages=8):
+    def setup(workdir):
+        from article_to_xhs import build_xhs_artifacts, build_xhs_images
+        from benchmarks.datasets import make_paragraphs
+
+        text = make_paragraphs(paragraphs)
+        title = "基准测试：把一篇很长的文章排版成小红书图片"
+
+        def run():
+            if image_format == "PNG":
+                paths, scratch = build_xhs_images(title, text, "bench.example.com", max_pages=max_pages)
+                scratch.cleanup()
+                return len(paths)
+            artifacts = build_xhs_artifacts(
+                title, text, "bench.example.com", max_pages=max_pages, image_format=image_format
+            )
+            return len(artifacts)
+        return run
+    return setup
+
+
+def _markdown_case(sections):
+    def setup(workdir):
+        from benchmarks.datasets import make_markdown
+        from pdf2png import markdown_to_image
+
+        md_text = make_markdown(sections)
+
+        def run():
+            _, scratch = markdown_to_image(md_text)
+            scratch.cleanup()
+            return 1
+        return run
+    return setup
+
+
+def _overlay_case(size, cold=False, steps=10):
+    def setup(workdir):
+        from PIL import Image
+
+        import CN_PNG
+        from benchmarks.datasets import make_avatar
+
+        flag = Image.open(os.path.join(ROOT, CN_PNG.FLAG_PATH)).convert("RGBA")
+        head = make_avatar(size)
+        # 模拟拖动强度滑块：同一头像连续渲染多档强度
+        strengths = [4.0 + 4.0 * i / max(1, steps - 1) for i in range(steps)]
+
+        def run():
+            if cold:
+                CN_PNG._layer_cache.clear()
+            for strength in strengths:
+                CN_PNG.composite_overlay(head, flag, strength)
+            return len(strengths)
+        return run
+    return setup
+
+
+def _extract_case(fixture, backend, loops=20):
+    def setup(workdir):
+        from article_extract import EXTRACTORS
+        from benchmarks.datasets import load_html_fixtures, make_long_html
+
+        if fixture == "long":
+            html = make_long_html(600)
+        else:
+            html = load_html_fixtures()[fixture]
+        extractor = EXTRACTORS[backend]
+
+        def run():
+            for _ in range(loops):
+                extractor(html)
+            return loops
+        return run
+    return setup
+
+
+def build_cases(quick=False):
+    from article_extract import default_backend
+    from benchmarks.datasets import load_html_fixtures
+    from pdf2png import DEFAULT_RENDER_WORKERS, PARALLEL_MIN_PAGES
+
+    cases = []
+    for pages in ((10,) if quick else (10, 60)):
+        for zoom in ((2.0,) if quick else (1.0, 2.0)):
+            cases.append(Case(f"pdf/{pages}p_z{zoom:g}_w1", _pdf_case(pages, zoom, 1), "pages"))
+            if pages >= PARALLEL_MIN_PAGES and DEFAULT_RENDER_WORKERS > 1:
+                cases.append(Case(
+                    f"pdf/{pages}p_z{zoom:g}_w{DEFAULT_RENDER_WORKERS}",
+                    _pdf_case(pages, zoom, DEFAULT_RENDER_WORKERS),
+                    "pages",
+                ))
+    if not quick:
+        cases.append(Case("pdf/60p_z2_merge3", _pdf_case(60, 2.0, 1, pages_per_image=3), "pages"))
+
+    cases.append(Case("xhs/png_8p", _xhs_case(80, "PNG"), "images"))
+    if not quick:
+        cases.append(Case("xhs/jpeg_8p", _xhs_case(80, "JPEG"), "images"))
+
+    cases.append(Case("markdown/20s", _markdown_case(20), "images"))
+
+    for size in (((512, 512),) if quick else ((512, 512), (2048, 2048), (3840, 2160))):
+        label = f"{size[0]}x{size[1]}"
+        cases.append(Case(f"overlay/{label}", _overlay_case(size), "frames"))
+        cases.append(Case(f"overlay/{label}_cold", _overlay_case(size, cold=True), "frames"))
+
+    backends = ["selectors"] + (["density"] if default_backend() == "density" else [])
+    fixtures = [*load_html_fixtures(), "long"]
+    for fixture in fixtures:
+        for backend in backends:
+            cases.append(Case(f"extract/{fixture}/{backend}", _extract_case(fixture, backend), "docs", repeat=5))
+    return {case.name: case for case in cases}
+
+
+def _peak_rss_mb(who):
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_case(name, quick, repeat):
+    # 在独立的 spawn 子进程中执行，峰值内存只反映当前用例
+    case = build_cases(quick)[name]
+    repeat = repeat or case.repeat
+    with tempfile.TemporaryDirectory(prefix="webapp-bench-") as workdir:
+        run = case.setup(workdir)
+        setup_rss = _peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+
+        started = time.perf_counter()
+        units = run()
+        first = time.perf_counter() - started
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            units = run()
+            timings.append(time.perf_counter() - started)
+
+    median = statistics.median(timings)
+    return {
+        "unit": case.unit,
+        "units": units,
+        "repeat": repeat,
+        "seconds": median,
+        "seconds_min": min(timings),
+        "seconds_first": first,
+        "throughput": units / median if median > 0 else None,
+        "setup_rss_mb": setup_rss,
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "children_peak_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _metadata(quick):
+    versions = {}
+    for module in ("fitz", "PIL", "numpy", "lxml", "bs4"):
+        try:
+            mod = __import__(module)
+        except ImportError:
+            continue
+        versions[module] = getattr(mod, "__version__", None) or getattr(mod, "VersionBind", None)
+    return {
+        "created_at": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "quick": quick,
+        "versions": versions,
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, rss_threshold=DEFAULT_RSS_THRESHOLD):
+    # 返回 [(用例, 状态, 说明)]，状态为 regression / improved / ok / new
+    rows = []
+    base_results = baseline.get("results", {})
+    for name, current in results.items():
+        base = base_results.get(name)
+        if base is None:
+            rows.append((name, "new", ""))
+            continue
+        ratio = current["seconds"] / base["seconds"] if base["seconds"] else float("inf")
+        notes = [f"time x{ratio:.2f}"]
+        status = "ok"
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold):
+            status = "improved"
+
+        cur_rss, base_rss = current.get("peak_rss_mb"), base.get("peak_rss_mb")
+        if cur_rss is not None and base_rss:
+            notes.append(f"rss {base_rss:.0f}->{cur_rss:.0f} MB")
+            if cur_rss > base_rss * (1 + rss_threshold) and cur_rss - base_rss > MIN_RSS_DELTA_MB:
+                status = "regression"
+        rows.append((name, status, ", ".join(notes)))
+    return rows
+
+
+def _format_result(name, r):
+    rss = f"{r['peak_rss_mb']:.0f} MB" if r.get("peak_rss_mb") is not None else "-"
+    rate = f"{r['throughput']:.1f} {r['unit']}/s" if r.get("throughput") else "-"
+    return f"{name:<36} {r['seconds'] * 1000:>10.1f} ms  {rate:>16}  first {r['seconds_first'] * 1000:>9.1f} ms  rss {rss}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="离线基准测试：PDF 渲染、小红书图片、Markdown、头像叠加和正文提取")
+    parser.add_argument("--quick", action="store_true", help="只跑小规模用例")
+    parser.add_argument("-k", "--filter", default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--repeat", type=int, default=None, help="每个用例的计时次数（不含首次）")
+    parser.add_argument("--output", help="结果 JSON 路径，默认写入 benchmarks/results/")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="对比用的基线 JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果写为基线")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="耗时回归阈值（比例）")
+    parser.add_argument("--rss-threshold", type=float, default=DEFAULT_RSS_THRESHOLD, help="峰值内存回归阈值（比例）")
+    parser.add_argument("--list", action="store_true", help="列出用例后退出")
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)
+    # 渲染缓存、HTTP 缓存都指向临时目录，基准结果不受本机已有缓存影响
+    cache_root = tempfile.mkdtemp(prefix="webapp-bench-cache-")
+    os.environ["WEBAPP_CACHE_DIR"] = cache_root
+
+    names = [name for name in build_cases(args.quick) if args.filter in name]
+    if args.list:
+        print("\n".join(names))
+        return 0
+    if not names:
+        print(f"没有匹配 {args.filter!r} 的用例")
+        return 1
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[name] = pool.submit(_run_case, name, args.quick, args.repeat).result()
+        print(_format_result(name, results[name]), flush=True)
+
+    report = {"meta": _metadata(args.quick), "results": results}
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = dt.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已更新：{args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("未找到基线文件，跳过对比（使用 --save-baseline 生成）")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("meta", {}).get("cpu_count") != os.cpu_count():
+        print("注意：基线来自不同核数的机器，对比结果仅供参考")
+
+    rows = compare(results, baseline, args.threshold, args.rss_threshold)
+    print()
+    for name, status, notes in rows:
+        print(f"{status:<11} {name:<36} {notes}")
+    regressions = [name for name, status, _ in rows if status == "regression"]
+    if regressions:
+        print(f"\n{len(regressions)} 个用例出现回归")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
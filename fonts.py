@@ -0,0 +1,67 @@
+import os
+import threading
+from functools import lru_cache
+
+from PIL import ImageFont
+
+
+REGULAR_CANDIDATES = (
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/Hiragino Sans GB.ttc",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+)
+BOLD_CANDIDATES = (
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/Hiragino Sans GB.ttc",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+)
+
+_fonts = {}
+_fonts_lock = threading.Lock()
+
+
+def get_font(path, size: int):
+    # 进程内按 (路径, 字号) 缓存 FreeTypeFont，TTC 文件只解析一次；加载失败返回 None 并同样缓存
+    key = (path, int(size))
+    with _fonts_lock:
+        if key in _fonts:
+            return _fonts[key]
+    try:
+        font = ImageFont.truetype(path, size=int(size))
+    except (OSError, ValueError):
+        font = None
+    with _fonts_lock:
+        return _fonts.setdefault(key, font)
+
+
+@lru_cache(maxsize=None)
+def resolve_font_path(candidates: tuple):
+    # 每组候选字体只探测一次文件系统
+    for path in candidates:
+        if os.path.exists(path) and get_font(path, 12) is not None:
+            return path
+    return None
+
+
+@lru_cache(maxsize=None)
+def _default_font():
+    return ImageFont.load_default()
+
+
+def load_font(size: int, bold: bool = False):
+    path = resolve_font_path(BOLD_CANDIDATES if bold else REGULAR_CANDIDATES)
+    font = get_font(path, size) if path else None
+    return font or _default_font()
+
+
+def load_named_font(name: str, size: int, fallback=None):
+    # 按文件名加载（由 FreeType 在系统字体目录中查找），找不到时返回 fallback 或默认字体
+    font = get_font(name, size)
+    if font is not None:
+        return font
+    return fallback if fallback is not None else _default_font()
+
+
+@lru_cache(maxsize=None)
+def char_width(font, ch: str):
+    return font.getlength(ch)
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.compat import chardet
+from urllib3.util.retry import Retry
+
+from app_dirs import cache_dir
+
+
+REQUEST_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+    )
+}
+
+DEFAULT_TTL = 10 * 60
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+# 响应缓存总容量，超出后按最近使用时间淘汰
+DEFAULT_CACHE_BYTES = 1024 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+CACHED_HEADERS = ("content-type", "etag", "last-modified", "content-length")
+
+
+class ResponseTooLarge(ValueError):
+    pass
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    # 进程内共用一个带连接池和退避重试的 Session
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET", "HEAD"),
+                respect_retry_after_header=True,
+            )
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+            session = requests.Session()
+            session.headers.update(REQUEST_HEADERS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+class HttpResponse:
+    def __init__(self, url, status_code, headers, body_path=None, from_cache=False, content=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.body_path = body_path
+        self.from_cache = from_cache
+        self.encoding = requests.utils.get_encoding_from_headers(headers)
+        self._content = content
+
+    @property
+    def content(self):
+        if self._content is None:
+            with open(self.body_path, "rb") as f:
+                self._content = f.read()
+        return self._content
+
+    @property
+    def apparent_encoding(self):
+        return chardet.detect(self.content)["encoding"]
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+# 磁盘响应缓存：TTL 内直接返回，过期后带 ETag / Last-Modified 做条件请求；
+# 超过 max_age 未使用的条目删除，总大小超过 max_bytes 时按最近使用时间淘汰
+class ResponseCache:
+    def __init__(self, root=None, max_age=DEFAULT_MAX_AGE, max_bytes=DEFAULT_CACHE_BYTES):
+        self.root = root or cache_dir("http")
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.root, key)
+        return base + ".json", base + ".body"
+
+    def load(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            # 响应体的修改时间即最近使用时间
+            os.utime(body_path)
+        except FileNotFoundError:
+            return None
+        if meta.get("url") != url:
+            return None
+        meta["body_path"] = body_path
+        return meta
+
+    def touch(self, meta):
+        meta = dict(meta, fetched_at=time.time())
+        self._write_meta(meta["url"], meta)
+        os.utime(meta["body_path"])
+        return meta
+
+    def _write_meta(self, url, meta):
+        meta_path, _ = self._paths(url)
+        meta = {k: v for k, v in meta.items() if k != "body_path"}
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def store(self, url, status_code, headers, tmp_body_path):
+        _, body_path = self._paths(url)
+        os.replace(tmp_body_path, body_path)
+        meta = {
+            "url": url,
+            "status_code": status_code,
+            "headers": headers,
+            "fetched_at": time.time(),
+        }
+        self._write_meta(url, meta)
+        self.evict()
+        meta["body_path"] = body_path
+        return meta
+
+    def new_body_file(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        return os.fdopen(fd, "wb"), tmp_path
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _remove_entry(self, body_path):
+        # 先删元数据，避免留下指向不存在响应体的条目
+        self._remove(body_path[:-len(".body")] + ".json")
+        self._remove(body_path)
+
+    def evict(self):
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            bodies = []
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    if entry.name.endswith(".body"):
+                        if stat.st_mtime < cutoff:
+                            self._remove_entry(entry.path)
+                        else:
+                            bodies.append((stat.st_mtime, stat.st_size, entry.path))
+                    elif stat.st_mtime < cutoff and not (
+                        # 元数据随响应体一起删除，只清理没有响应体的残留
+                        entry.name.endswith(".json") and os.path.exists(entry.path[:-len(".json")] + ".body")
+                    ):
+                        self._remove(entry.path)
+
+            total = sum(size for _, size, _ in bodies)
+            if total <= self.max_bytes:
+                return
+            target = int(self.max_bytes * 0.9)
+            for _, size, body_path in sorted(bodies):
+                if total <= target:
+                    break
+                self._remove_entry(body_path)
+                total -= size
+
+
+_default_cache = None
+
+
+def get_response_cache():
+    global _default_cache
+    with _session_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+    return _default_cache
+
+
+def _download(resp, fileobj, max_bytes, progress=None):
+    declared = resp.headers.get("Content-Length")
+    total = int(declared) if declared and declared.isdigit() else None
+    if total is not None and total > max_bytes:
+        raise ResponseTooLarge(f"文件过大（{total / 1024 / 1024:.1f} MB），上限 {max_bytes / 1024 / 1024:.0f} MB")
+    received = 0
+    for chunk in resp.iter_content(CHUNK_SIZE):
+        received += len(chunk)
+        if received > max_bytes:
+            raise ResponseTooLarge(f"文件超过下载上限 {max_bytes / 1024 / 1024:.0f} MB")
+        fileobj.write(chunk)
+        if progress is not None:
+            progress(received, total)
+    return received
+
+
+def fetch(url, timeout=15, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, use_cache=True, progress=None):
+    # 响应体分块写入磁盘，内存占用与文件大小无关；progress(已接收字节, 总字节或 None)
+    cache = get_response_cache()
+    cached = cache.load(url) if use_cache else None
+    if cached is not None and time.time() - cached["fetched_at"] < ttl:
+        return HttpResponse(url, cached["status_code"], cached["headers"], cached["body_path"], from_cache=True)
+
+    headers = {}
+    if cached is not None:
+        if cached["headers"].get("etag"):
+            headers["If-None-Match"] = cached["headers"]["etag"]
+        if cached["headers"].get("last-modified"):
+            headers["If-Modified-Since"] = cached["headers"]["last-modified"]
+
+    with get_session().get(url, headers=headers, timeout=timeout, stream=True) as resp:
+        if resp.status_code == 304 and cached is not None:
+            cached = cache.touch(cached)
+            return HttpResponse(url, cached["status_code"], cached["headers"], cached["body_path"], from_cache=True)
+        resp.raise_for_status()
+
+        kept_headers = {k: resp.headers[k] for k in CACHED_HEADERS if k in resp.headers}
+        fileobj, tmp_path = cache.new_body_file()
+        try:
+            with fileobj:
+                _download(resp, fileobj, max_bytes, progress=progress)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    if "no-store" in resp.headers.get("Cache-Control", ""):
+        # 不允许缓存的响应读入内存后立即删除临时文件
+        with open(tmp_path, "rb") as f:
+            content = f.read()
+        os.remove(tmp_path)
+        return HttpResponse(url, resp.status_code, kept_headers, content=content)
+    meta = cache.store(url, resp.status_code, kept_headers, tmp_path)
+    return HttpResponse(url, resp.status_code, kept_headers, meta["body_path"])
@@ -0,0 +1,357 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from app_dirs import cache_dir
+
+
+# WEBAPP_METRICS=0 关闭记录；WEBAPP_TRACE_MEMORY=1 额外用 tracemalloc 统计 Python 分配峰值（有额外开销）
+METRICS_ENABLED = os.environ.get("WEBAPP_METRICS", "1") != "0"
+TRACE_MEMORY = os.environ.get("WEBAPP_TRACE_MEMORY") == "1"
+HISTORY_SIZE = 500
+PERCENTILES = (0.5, 0.9, 0.99)
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+
+logger = logging.getLogger("webapp.metrics")
+
+_current = contextvars.ContextVar("webapp_request", default=None)
+_history = deque(maxlen=HISTORY_SIZE)
+_imports = {}
+_lock = threading.Lock()
+_log_ready = False
+
+
+def _rss_bytes():
+    # Linux 读 /proc 拿当前常驻内存；其他平台不记录
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def metrics_dir():
+    return cache_dir("metrics")
+
+
+def _setup_log():
+    # 结构化日志：每个请求一行 JSON，按大小轮转
+    global _log_ready
+    with _lock:
+        if _log_ready:
+            return
+        if not logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(
+                os.path.join(metrics_dir(), "requests.jsonl"),
+                maxBytes=LOG_MAX_BYTES,
+                backupCount=LOG_BACKUPS,
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        _log_ready = True
+
+
+class RequestMetrics:
+    def __init__(self, tool, fields):
+        self.tool = tool
+        self.fields = fields
+        self.request_id = uuid.uuid4().hex[:12]
+        self.started_at = time.time()
+        self.stages = {}
+
+    def add(self, name, seconds, rss_delta=None, py_peak=None):
+        entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "rss_delta": 0, "py_peak": None})
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        if rss_delta is not None:
+            entry["rss_delta"] += rss_delta
+        if py_peak is not None:
+            entry["py_peak"] = max(entry["py_peak"] or 0, py_peak)
+
+    def merge(self, name, other):
+        # 并入另一份同结构的阶段统计（如后台任务进程中收集的）
+        entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "rss_delta": 0, "py_peak": None})
+        entry["seconds"] += other["seconds"]
+        entry["calls"] += other["calls"]
+        entry["rss_delta"] += other.get("rss_delta") or 0
+        if other.get("py_peak") is not None:
+            entry["py_peak"] = max(entry["py_peak"] or 0, other["py_peak"])
+
+
+@contextmanager
+def track_request(tool, **fields):
+    # 一次用户操作（一次转换 / 一次抓取）对应一条记录，内部的 stage() 计时汇总到这里
+    if not METRICS_ENABLED:
+        yield None
+        return
+    if TRACE_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    request = RequestMetrics(tool, fields)
+    token = _current.set(request)
+    rss_start = _rss_bytes()
+    started = time.perf_counter()
+    status, error = "ok", None
+    try:
+        yield request
+    except BaseException as exc:
+        status, error = "error", f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _current.reset(token)
+        _finish(request, time.perf_counter() - started, rss_start, status, error)
+
+
+@contextmanager
+def collect_stages(tool, **fields):
+    # 后台任务进程中使用：与 track_request 一样收集 stage() 计时，但不写日志和指标文件，
+    # 统计随任务记录交回提交方，由 merge_stages 并入界面一侧的请求
+    if not METRICS_ENABLED:
+        yield None
+        return
+    request = RequestMetrics(tool, fields)
+    token = _current.set(request)
+    try:
+        yield request
+    finally:
+        _current.reset(token)
+
+
+def merge_stages(stages):
+    # 把其他进程收集到的阶段统计并入当前请求；不在请求内时不做任何事
+    request = _current.get()
+    if request is None or not stages:
+        return
+    for name, entry in stages.items():
+        request.merge(name, entry)
+
+
+@contextmanager
+def stage(name):
+    # 同一请求中同名阶段多次进入时累加耗时和次数；不在请求内时不做任何事
+    request = _current.get()
+    if request is None:
+        yield
+        return
+    rss_before = _rss_bytes()
+    if tracemalloc.is_tracing():
+        # 多个会话同时运行时峰值会互相影响，只作参考
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        py_peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+        rss_after = _rss_bytes()
+        rss_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        request.add(name, elapsed, rss_delta, py_peak)
+
+
+def timed_iter(name, iterable):
+    # 只统计从迭代器取下一项所花的时间，消费方处理每一项的时间不计入
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def _finish(request, total, rss_start, status, error):
+    rss_end = _rss_bytes()
+    record = {
+        "ts": request.started_at,
+        "request_id": request.request_id,
+        "tool": request.tool,
+        "status": status,
+        "error": error,
+        "total_seconds": total,
+        "rss_start": rss_start,
+        "rss_end": rss_end,
+        "fields": request.fields,
+        "stages": request.stages,
+    }
+    with _lock:
+        _history.append(record)
+    try:
+        _setup_log()
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
+        write_metrics_file()
+    except OSError:
+        # 指标写入失败不能影响用户请求
+        pass
+
+
+def record_import(module, seconds, background=False):
+    # 工具模块的首次导入耗时（按需导入或后台预热），每个进程每个模块只记录一次
+    with _lock:
+        _imports.setdefault(module, {"seconds": seconds, "background": background, "ts": time.time()})
+    if not METRICS_ENABLED:
+        return
+    try:
+        _setup_log()
+        logger.info(json.dumps(
+            {"ts": time.time(), "event": "import", "module": module, "seconds": seconds, "background": background}
+        ))
+        write_metrics_file()
+    except OSError:
+        pass
+
+
+def import_timings():
+    with _lock:
+        return dict(_imports)
+
+
+def recent_requests(tool=None, limit=20):
+    with _lock:
+        records = list(_history)
+    if tool is not None:
+        records = [r for r in records if r["tool"] == tool]
+    return records[-limit:][::-1]
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def stage_percentiles(tool=None):
+    # 最近 HISTORY_SIZE 个请求上的滚动分位数：{(工具, 阶段): {"count", "sum", 0.5, 0.9, 0.99}}
+    samples = {}
+    for record in recent_requests(tool, limit=HISTORY_SIZE):
+        samples.setdefault((record["tool"], "total"), []).append(record["total_seconds"])
+        for name, entry in record["stages"].items():
+            samples.setdefault((record["tool"], name), []).append(entry["seconds"])
+    result = {}
+    for key, values in samples.items():
+        values.sort()
+        summary = {"count": len(values), "sum": sum(values)}
+        for q in PERCENTILES:
+            summary[q] = _percentile(values, q)
+        result[key] = summary
+    return result
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def write_metrics_file(path=None):
+    # Prometheus 文本格式，可由 node_exporter 的 textfile collector 等直接抓取；写临时文件后原子替换
+    path = path or os.path.join(metrics_dir(), "webapp.prom")
+    lines = [
+        "# HELP webapp_stage_seconds Stage wall time over the most recent requests.",
+        "# TYPE webapp_stage_seconds summary",
+    ]
+    for (tool, name), summary in sorted(stage_percentiles().items()):
+        labels = f'tool="{_label(tool)}",stage="{_label(name)}"'
+        for q in PERCENTILES:
+            lines.append(f'webapp_stage_seconds{{{labels},quantile="{q}"}} {summary[q]:.6f}')
+        lines.append(f"webapp_stage_seconds_sum{{{labels}}} {summary['sum']:.6f}")
+        lines.append(f"webapp_stage_seconds_count{{{labels}}} {summary['count']}")
+
+    counts = {}
+    for record in recent_requests(limit=HISTORY_SIZE):
+        key = (record["tool"], record["status"])
+        counts[key] = counts.get(key, 0) + 1
+    lines.append("# HELP webapp_requests Requests in the rolling window by tool and status.")
+    lines.append("# TYPE webapp_requests gauge")
+    for (tool, status), count in sorted(counts.items()):
+        lines.append(f'webapp_requests{{tool="{_label(tool)}",status="{status}"}} {count}')
+
+    imports = import_timings()
+    if imports:
+        lines.append("# HELP webapp_module_import_seconds First import time of each tool module.")
+        lines.append("# TYPE webapp_module_import_seconds gauge")
+        for module, entry in sorted(imports.items()):
+            lines.append(
+                f'webapp_module_import_seconds{{module="{_label(module)}",'
+                f'background="{str(entry["background"]).lower()}"}} {entry["seconds"]:.6f}'
+            )
+
+    rss = _rss_bytes()
+    if rss is not None:
+        lines.append("# TYPE webapp_process_rss_bytes gauge")
+        lines.append(f"webapp_process_rss_bytes {rss}")
+
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    # mkstemp 建出的文件只有属主可读，采集程序可能以其他用户运行
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def debug_enabled():
+    import streamlit as st
+
+    if os.environ.get("WEBAPP_DEBUG") == "1":
+        return True
+    try:
+        return st.query_params.get("debug") == "1"
+    except Exception:
+        return False
+
+
+def render_debug_panel():
+    # 侧边栏调试面板：WEBAPP_DEBUG=1 或页面地址带 ?debug=1 时显示
+    import streamlit as st
+
+    if not METRICS_ENABLED or not debug_enabled():
+        return
+    with st.sidebar.expander("🛠 性能调试", expanded=False):
+        imports = import_timings()
+        if imports:
+            st.markdown("**模块导入（ms）**")
+            st.table([
+                {"模块": module, "耗时": round(entry["seconds"] * 1000, 1), "后台预热": entry["background"]}
+                for module, entry in sorted(imports.items())
+            ])
+        records = recent_requests(limit=5)
+        if not records:
+            st.caption("暂无记录，完成一次转换后显示各阶段耗时。")
+            return
+        for record in records:
+            status = "✅" if record["status"] == "ok" else "❌"
+            st.markdown(f"{status} **{record['tool']}** · {record['total_seconds'] * 1000:.0f} ms")
+            st.table([
+                {
+                    "阶段": name,
+                    "耗时 (ms)": round(entry["seconds"] * 1000, 1),
+                    "次数": entry["calls"],
+                    "RSS 变化 (MB)": round(entry["rss_delta"] / 1024 / 1024, 1),
+                }
+                for name, entry in sorted(record["stages"].items(), key=lambda kv: -kv[1]["seconds"])
+            ])
+        st.markdown("**滚动分位数（ms）**")
+        st.table([
+            {
+                "工具": tool,
+                "阶段": name,
+                "次数": summary["count"],
+                "p50": round(summary[0.5] * 1000, 1),
+                "p90": round(summary[0.9] * 1000, 1),
+                "p99": round(summary[0.99] * 1000, 1),
+            }
+            for (tool, name), summary in sorted(stage_percentiles().items())
+        ])
+        st.caption(f"指标文件：{os.path.join(metrics_dir(), 'webapp.prom')}")
@@ -0,0 +1,318 @@
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import streamlit as st
+
+from app_dirs import cache_dir
+from process_utils import pid_alive
+from instrumentation import collect_stages, merge_stages
+
+
+# 任务类型 -> "模块:函数"，函数签名为 fn(job: JobContext, params) -> 可 pickle 的结果或 None；
+# 在工作进程中按名导入，避免把函数本身跨进程传递
+JOB_KINDS = {
+    "pdf2png": "pdf2png:run_pdf_job",
+    "article_to_xhs": "article_to_xhs:run_xhs_job",
+    "article_to_xhs_batch": "article_to_xhs:run_xhs_batch_job",
+    "arxiv_today": "arxiv_today:run_arxiv_job",
+}
+
+DEFAULT_JOB_WORKERS = max(1, min(4, os.cpu_count() or 1))
+JOB_MAX_AGE = 24 * 60 * 60
+PROGRESS_INTERVAL = 0.25
+ACTIVE = ("queued", "running")
+FINISHED = ("done", "failed")
+
+
+def job_id_for(kind, params):
+    # 相同类型 + 相同参数得到相同的任务 id，重跑和重复提交直接复用已有任务
+    payload = json.dumps([kind, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:20]
+
+
+def _write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+# 工作进程中传给任务函数的句柄：读取输入、写出结果、汇报进度
+class JobContext:
+    def __init__(self, job_dir, record):
+        self.job_dir = job_dir
+        self.record = record
+        self.output_dir = os.path.join(job_dir, "outputs")
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._last_write = 0.0
+
+    @property
+    def params(self):
+        return self.record["params"]
+
+    @property
+    def options(self):
+        # 不影响结果的运行选项（如并发数），不参与任务 id
+        return self.record.get("options") or {}
+
+    def input_path(self, name):
+        return os.path.join(self.job_dir, "inputs", name)
+
+    def output_path(self, name):
+        path = os.path.join(self.output_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def add_output(self, name):
+        self.record["outputs"].append(name)
+
+    def set_archive(self, name):
+        self.record["archive"] = name
+
+    def progress(self, fraction, message=None, **extra):
+        # 写注册表有节流，extra 中的字段（如批量任务的逐条状态）原样存入记录供界面展示
+        self.record["progress"] = max(0.0, min(1.0, float(fraction)))
+        if message is not None:
+            self.record["message"] = message
+        self.record["extra"].update(extra)
+        now = time.time()
+        if extra or fraction >= 1 or now - self._last_write >= PROGRESS_INTERVAL:
+            self.save()
+
+    def save(self):
+        self.record["updated_at"] = time.time()
+        _write_json(os.path.join(self.job_dir, "job.json"), self.record)
+        self._last_write = time.time()
+
+
+def _run_job(job_dir):
+    # 工作进程入口：任务函数的异常记录到注册表中，不向提交方抛出
+    with open(os.path.join(job_dir, "job.json"), encoding="utf-8") as f:
+        record = json.load(f)
+    job = JobContext(job_dir, record)
+    record.update(status="running", worker_pid=os.getpid(), started_at=time.time())
+    job.save()
+    metrics = None
+    try:
+        module_name, func_name = JOB_KINDS[record["kind"]].split(":")
+        func = getattr(importlib.import_module(module_name), func_name)
+        # 任务函数中的 stage() 计时在工作进程里收集，随记录交回界面
+        with collect_stages(record["kind"], job=record["id"]) as metrics:
+            result = func(job, record["params"])
+        if result is not None:
+            with open(os.path.join(job_dir, "result.pkl"), "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        record.update(status="done", progress=1.0, has_result=result is not None, finished_at=time.time())
+    except Exception as exc:
+        record.update(
+            status="failed", error=f"{type(exc).__name__}: {exc}", traceback=traceback.format_exc(),
+            finished_at=time.time(),
+        )
+    if metrics is not None:
+        record["extra"]["stages"] = metrics.stages
+    job.save()
+
+
+# 本地任务系统：进程池执行，每个任务一个目录（job.json + inputs/ + outputs/ + result.pkl）
+class JobManager:
+    def __init__(self, root=None, max_workers=DEFAULT_JOB_WORKERS, max_age=JOB_MAX_AGE):
+        self.root = root or cache_dir("jobs")
+        self.max_workers = max_workers
+        self.max_age = max_age
+        # 可重入：任务已结束时 add_done_callback 会在 submit 持锁期间同步回调
+        self._lock = threading.RLock()
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def get(self, job_id):
+        try:
+            with open(os.path.join(self._job_dir(job_id), "job.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _is_stale(self, record):
+        # 排队 / 运行中的任务，如果提交它的服务进程已经不在（重启过），视为失效
+        if record["status"] not in ACTIVE:
+            return False
+        if record.get("owner_pid") != os.getpid():
+            return not pid_alive(record.get("owner_pid", 0))
+        worker_pid = record.get("worker_pid")
+        return worker_pid is not None and not pid_alive(worker_pid)
+
+    def find(self, kind, params, max_age=None):
+        # 返回可复用的任务记录：进行中的，或在 max_age 秒内完成的
+        record = self.get(job_id_for(kind, params))
+        if record is None or self._is_stale(record) or record["status"] == "failed":
+            return None
+        if record["status"] == "done" and max_age is not None:
+            if time.time() - record.get("finished_at", 0) > max_age:
+                return None
+        return record
+
+    def submit(self, kind, params, inputs=None, max_age=None, options=None):
+        # inputs: {文件名: bytes 或本地路径}，在提交前写入任务目录；返回任务 id。
+        # 任务 id 只由 params 决定；options 放只影响运行方式、不影响结果的选项（如进程数），
+        # 修改它们会复用已有任务
+        if kind not in JOB_KINDS:
+            raise ValueError(f"未知的任务类型：{kind}")
+        job_id = job_id_for(kind, params)
+        with self._lock:
+            if self.find(kind, params, max_age=max_age) is not None:
+                return job_id
+
+            job_dir = self._job_dir(job_id)
+            shutil.rmtree(job_dir, ignore_errors=True)
+            os.makedirs(os.path.join(job_dir, "inputs"))
+            for name, data in (inputs or {}).items():
+                target = os.path.join(job_dir, "inputs", name)
+                if isinstance(data, (bytes, bytearray, memoryview)):
+                    with open(target, "wb") as f:
+                        f.write(data)
+                else:
+                    try:
+                        os.link(os.fspath(data), target)
+                    except OSError:
+                        shutil.copyfile(os.fspath(data), target)
+
+            now = time.time()
+            record = {
+                "id": job_id,
+                "kind": kind,
+                "params": params,
+                "options": options or {},
+                "status": "queued",
+                "progress": 0.0,
+                "message": "排队中",
+                "outputs": [],
+                "archive": None,
+                "extra": {},
+                "error": None,
+                "owner_pid": os.getpid(),
+                "worker_pid": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            _write_json(os.path.join(job_dir, "job.json"), record)
+            try:
+                future = self._get_executor().submit(_run_job, job_dir)
+            except BrokenProcessPool:
+                # 进程池在之前的任务中崩溃，换一个新的
+                self._executor = None
+                future = self._get_executor().submit(_run_job, job_dir)
+            future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+        self.sweep()
+        return job_id
+
+    def _on_done(self, job_id, future):
+        # 工作进程异常退出（如被 OOM 杀掉）时任务函数来不及写记录，这里补记为失败
+        if future.cancelled() or future.exception() is None:
+            return
+        exc = future.exception()
+        record = self.get(job_id)
+        if record is not None and record["status"] in ACTIVE:
+            record.update(status="failed", error=f"{type(exc).__name__}: {exc}", finished_at=time.time())
+            _write_json(os.path.join(self._job_dir(job_id), "job.json"), record)
+        if isinstance(exc, BrokenProcessPool):
+            with self._lock:
+                self._executor = None
+
+    def output_path(self, job_id, name):
+        return os.path.join(self._job_dir(job_id), "outputs", name)
+
+    def load_result(self, job_id):
+        try:
+            with open(os.path.join(self._job_dir(job_id), "result.pkl"), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def sweep(self):
+        # 删除超过 max_age 的已结束任务和失效任务
+        cutoff = time.time() - self.max_age
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if not entry.is_dir():
+                    continue
+                record = self.get(entry.name)
+                if record is None:
+                    expired = entry.stat().st_mtime < cutoff
+                else:
+                    expired = record["updated_at"] < cutoff and (
+                        record["status"] in FINISHED or self._is_stale(record)
+                    )
+                if expired:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def job_worker_count():
+    # 任务进程池大小；工作进程中也可调用，用来决定任务内部还能再开多少进程
+    return max(1, int(os.environ.get("WEBAPP_JOB_WORKERS", DEFAULT_JOB_WORKERS)))
+
+
+def get_job_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(max_workers=job_worker_count())
+            _manager.sweep()
+    return _manager
+
+
+def submit_job(kind, params, inputs=None, max_age=None, options=None):
+    return get_job_manager().submit(kind, params, inputs=inputs, max_age=max_age, options=options)
+
+
+def wait_for_job(job_id, poll_interval=0.5, on_update=None):
+    # 在脚本线程中轮询任务并刷新进度条，返回结束时的记录；
+    # 期间的任何交互都会触发重跑，重跑时用同一个 job_id 接着轮询，已完成的工作不会重做
+    manager = get_job_manager()
+    record = manager.get(job_id)
+    if record is None:
+        return None
+    waited = record["status"] in ACTIVE
+    progress = st.progress(record["progress"], text=record["message"])
+    while record["status"] in ACTIVE:
+        if on_update is not None:
+            on_update(record)
+        if manager._is_stale(record):
+            record = dict(record, status="failed", error="任务所在进程已退出，请重新提交")
+            break
+        time.sleep(poll_interval)
+        record = manager.get(job_id) or record
+        progress.progress(record["progress"], text=record["message"])
+    if on_update is not None:
+        on_update(record)
+    progress.empty()
+    if waited:
+        # 工作进程的阶段耗时只并入等到任务结束的那次请求，复用已完成的任务时不重复计入
+        merge_stages(record["extra"].get("stages"))
+    return record
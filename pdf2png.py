@@ -1,82 +1,354 @@
 import streamlit as st
+import multiprocessing
 import os
 import re
-import tempfile
-import textwrap
-import zipfile
-from io import BytesIO
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 import fitz
-import requests
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 
-REQUEST_HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
-    )
-}
+from archive import ArchiveBuilder
+from artifacts import encode_image, png_artifact
+from fonts import load_named_font
+from http_client import fetch as http_fetch
+from instrumentation import stage, timed_iter, track_request
+from jobs import get_job_manager, job_id_for, job_worker_count, submit_job, wait_for_job
+from render_cache import RenderCache, pdf_digest
+from scratch import create_scratch_dir
+from text_layout import wrap_text
+
+# 页数少于该值时直接串行渲染，进程池启动开销不划算
+PARALLEL_MIN_PAGES = 12
+DEFAULT_RENDER_WORKERS = max(1, min(16, os.cpu_count() or 1))
+# 缩略图预览：低倍率串行渲染，页数过多时只预览前 THUMBNAIL_LIMIT 页
+THUMBNAIL_ZOOM = 0.3
+THUMBNAIL_LIMIT = 120
+THUMBNAIL_COLUMNS = 4
 
 # ====== PDF 转图片（纵向合并功能） ======
-def pdf_to_images(pdf_stream, pages_per_image=1, zoom_x=2.0, zoom_y=2.0, rotation_angle=0):
-    images = []
-    tmpdirname = tempfile.mkdtemp()
+def _open_pdf(pdf_stream):
+    # 既支持内存中的字节，也支持磁盘上的 PDF 路径（按需读取，内存占用不随文件大小增长）
+    if isinstance(pdf_stream, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=pdf_stream, filetype="pdf")
+    return fitz.open(os.fspath(pdf_stream), filetype="pdf")
+
+
+def parse_page_ranges(spec, num_pages):
+    # "1-3,5,8-" 形式的页码范围（从 1 开始），返回排好序的 0 起页码；留空表示全部页面
+    spec = (spec or "").replace("，", ",").replace("–", "-").replace(" ", "")
+    if not spec:
+        return list(range(num_pages))
+    selected = set()
+    for part in spec.split(","):
+        if not part:
+            continue
+        match = re.fullmatch(r"(\d*)-(\d*)|(\d+)", part)
+        if not match or part == "-":
+            raise ValueError(f"无法识别的页码范围：{part}")
+        if match.group(3):
+            start = end = int(match.group(3))
+        else:
+            start = int(match.group(1)) if match.group(1) else 1
+            end = int(match.group(2)) if match.group(2) else num_pages
+        if start < 1 or start > num_pages:
+            raise ValueError(f"页码超出范围（共 {num_pages} 页）：{part}")
+        if end < start:
+            raise ValueError(f"页码范围无效（起始页大于结束页）：{part}")
+        selected.update(range(start - 1, min(end, num_pages)))
+    return sorted(selected)
+
+
+def _resolve_pages(pages, num_pages):
+    # pages 可以是页码范围字符串、0 起页码序列或 None（全部）
+    if pages is None:
+        return list(range(num_pages))
+    if isinstance(pages, str):
+        return parse_page_ranges(pages, num_pages)
+    return sorted({int(i) for i in pages if 0 <= int(i) < num_pages})
+
+
+def pdf_page_count(pdf_stream):
+    pdf = _open_pdf(pdf_stream)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _render_page(page, matrix):
+    # 返回 (图片, pixmap)：图片直接引用 pixmap 的采样缓冲区，不经过 PPM 编码/解码，也不复制像素；
+    # 图片用完之前调用方必须持有 pixmap，否则缓冲区会被释放
+    pix = page.get_pixmap(matrix=matrix, alpha=False)
+    img = Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1)
+    return img, pix
+
+
+def _merge_vertically(page_images):
+    if len(page_images) == 1:
+        return page_images[0]
+    merged_width = max(page.width for page in page_images)
+    merged_height = sum(page.height for page in page_images)
+    merged_img = Image.new("RGB", (merged_width, merged_height), color="white")
+
+    y_offset = 0
+    for page_img in page_images:
+        x_offset = (merged_width - page_img.width) // 2
+        merged_img.paste(page_img, (x_offset, y_offset))
+        y_offset += page_img.height
+    return merged_img
+
+
+# ====== 多进程渲染 ======
+_worker_pdf = None
+
+
+def _init_render_worker(pdf_stream):
+    # 每个工作进程各自打开一份 PDF，只在进程启动时传输一次字节（或路径）
+    global _worker_pdf
+    _worker_pdf = _open_pdf(pdf_stream)
+
+
+def _render_pages_in_worker(page_indices, zoom_x, zoom_y, rotation_angle, encode):
+    # encode 为真时（不合并页面）PNG 编码也在工作进程中完成，只把编码结果传回主进程；
+    # 否则传回原始采样数据，由主进程合并
+    matrix = fitz.Matrix(zoom_x, zoom_y).prerotate(rotation_angle)
+    results = []
+    for i in page_indices:
+        img, pix = _render_page(_worker_pdf[i], matrix)
+        if encode:
+            results.append(encode_image(img, f"page_{i + 1}.png"))
+        else:
+            results.append(((pix.width, pix.height), pix.stride, pix.samples))
+        del img, pix
+    return results
+
+
+def _iter_pages_parallel(pdf_stream, page_indices, zoom_x, zoom_y, rotation_angle, workers, encode=False):
+    # 每个任务负责一段页面；在途任务数有上限，按页序依次返回。
+    # encode 为真时产出 ImageArtifact，否则产出 (图片, None)，与串行渲染的 (图片, pixmap) 对应
+    pages_per_task = max(1, min(8, len(page_indices) // (workers * 4)))
+    tasks = [
+        page_indices[i:i + pages_per_task]
+        for i in range(0, len(page_indices), pages_per_task)
+    ]
+    max_in_flight = workers * 2
 
-    pages_per_image = max(1, int(pages_per_image))
-    pil_pages = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_render_worker,
+        initargs=(pdf_stream,),
+    ) as pool:
+        pending = deque()
+        task_iter = iter(tasks)
+        for task in task_iter:
+            pending.append(pool.submit(_render_pages_in_worker, task, zoom_x, zoom_y, rotation_angle, encode))
+            if len(pending) >= max_in_flight:
+                break
+        while pending:
+            results = pending.popleft().result()
+            next_task = next(task_iter, None)
+            if next_task is not None:
+                pending.append(pool.submit(_render_pages_in_worker, next_task, zoom_x, zoom_y, rotation_angle, encode))
+            if encode:
+                yield from results
+                continue
+            for size, stride, samples in results:
+                # bytes 对象由图片持有，无需再复制
+                yield Image.frombuffer("RGB", size, samples, "raw", "RGB", stride, 1), None
+
+
+def _iter_merged_groups(
+    pdf_stream, pages_per_image, zoom_x, zoom_y, rotation_angle, workers, cache, pages=None, digest=None
+):
+    # 逐组渲染：每次只保留当前合并组的页面，峰值内存只与 pages_per_image 相关。
+    # 产出 (合并图, 已编码的 PNG 字节, 缓存键)，前两者恰有一个不为 None；
+    # 缓存键不为 None 表示结果需要写入缓存（缓存命中时为 None）
     matrix = fitz.Matrix(zoom_x, zoom_y).prerotate(rotation_angle)
+    if cache is not None and digest is None:
+        digest = pdf_digest(pdf_stream)
+
+    def page_key(i):
+        return RenderCache.key(digest, i, zoom_x, zoom_y, rotation_angle, 1)
 
-    pdf = fitz.open(stream=pdf_stream, filetype="pdf")
+    def group_key(group):
+        # 连续页用起始页作键；选择了不连续页码时用全部页码，避免与连续合并组的缓存混淆
+        contiguous = group[-1] - group[0] == len(group) - 1
+        start = group[0] if contiguous else "+".join(str(i) for i in group)
+        return RenderCache.key(digest, start, zoom_x, zoom_y, rotation_angle, len(group))
+
+    rendered = iter(())
+    pdf = _open_pdf(pdf_stream)
     try:
-        for i in range(len(pdf)):
-            pix = pdf[i].get_pixmap(matrix=matrix, alpha=False)
-            pil_img = Image.open(BytesIO(pix.tobytes("ppm"))).convert("RGB")
-            pil_pages.append(pil_img)
+        selected = _resolve_pages(pages, len(pdf))
+        groups = [selected[s:s + pages_per_image] for s in range(0, len(selected), pages_per_image)]
+
+        # 只有所在合并组和该页本身都未命中缓存的页面才需要重新渲染；
+        # 单页组的组键就是页键，不重复查询。记下命中的组（按下标），之后只读取这些组，
+        # 未命中的组不再查第二次，避免重复计入未命中
+        cached_groups = set()
+        if cache is None:
+            todo = list(selected)
+        else:
+            todo = []
+            for n, group in enumerate(groups):
+                if cache.contains(group_key(group)):
+                    cached_groups.add(n)
+                    continue
+                todo.extend(i for i in group if len(group) == 1 or not cache.contains(page_key(i)))
+        todo_set = set(todo)
+
+        # 不合并页面时并行渲染的工作进程直接编码 PNG，主进程不再串行编码
+        encode_in_workers = False
+        if workers <= 1 or len(todo) < PARALLEL_MIN_PAGES:
+            rendered = (_render_page(pdf[i], matrix) for i in todo)
+        else:
+            encode_in_workers = pages_per_image == 1
+            rendered = _iter_pages_parallel(
+                pdf_stream, todo, zoom_x, zoom_y, rotation_angle, min(workers, len(todo)), encode_in_workers
+            )
+
+        def page_image(i):
+            # 返回 (图片, pixmap)，pixmap 可能为 None
+            if i in todo_set:
+                return next(rendered)
+            img = cache.get_image(page_key(i))
+            if img is not None:
+                return img, None
+            return _render_page(pdf[i], matrix)
+
+        for n, group in enumerate(groups):
+            key = group_key(group) if cache is not None else None
+            if n in cached_groups:
+                data = cache.get(key)
+                if data is not None:
+                    yield None, data, None
+                    continue
+            if encode_in_workers and group[0] in todo_set:
+                yield None, next(rendered).data, key
+                continue
+
+            # 合并图交给调用方编码期间，各页的 pixmap 必须保持存活
+            current_pages = [page_image(i) for i in group]
+            merged_img = _merge_vertically([img for img, _ in current_pages])
+            yield merged_img, None, key
+            del merged_img, current_pages
     finally:
+        # 提前结束迭代时也要及时关闭进程池
+        if hasattr(rendered, "close"):
+            rendered.close()
         pdf.close()
 
-    num_pages = len(pil_pages)
-    if num_pages == 0:
-        return images, tmpdirname
 
-    for i in range(0, num_pages, pages_per_image):
-        current_pages = pil_pages[i:i + pages_per_image]
-        merged_width = max(page.width for page in current_pages)
-        merged_height = sum(page.height for page in current_pages)
-        merged_img = Image.new("RGB", (merged_width, merged_height), color="white")
+def iter_pdf_artifacts(
+    pdf_stream, pages_per_image=1, zoom_x=2.0, zoom_y=2.0, rotation_angle=0, workers=None, cache=None, pages=None,
+    digest=None,
+):
+    # 每张合并图只编码一次 PNG，缓存命中时直接复用缓存里的字节；
+    # pages 为页码范围字符串（如 "1-3,5"）或 0 起页码序列，None 表示全部页面；
+    # digest 为已算好的 pdf_digest，省略时按需计算
+    workers = DEFAULT_RENDER_WORKERS if workers is None else max(1, int(workers))
+    merged_iter = _iter_merged_groups(
+        pdf_stream, max(1, int(pages_per_image)), zoom_x, zoom_y, rotation_angle, workers, cache, pages, digest
+    )
+    for idx, (merged_img, data, key) in enumerate(timed_iter("rasterize", merged_iter), start=1):
+        name = f"merged_page_{idx}.png"
+        if merged_img is None:
+            artifact = png_artifact(name, data)
+        else:
+            with stage("png_encode"):
+                artifact = encode_image(merged_img, name)
+            del merged_img
+        if key is not None:
+            with stage("cache_write"):
+                cache.put(key, artifact.data)
+        yield artifact
+
+
+def pdf_to_images(
+    pdf_stream, pages_per_image=1, zoom_x=2.0, zoom_y=2.0, rotation_angle=0, workers=None, cache=None,
+    session_id=None, pages=None,
+):
+    images = []
+    scratch = create_scratch_dir(session_id=session_id, prefix="pdf_")
+
+    artifacts = iter_pdf_artifacts(
+        pdf_stream,
+        pages_per_image=pages_per_image,
+        zoom_x=zoom_x,
+        zoom_y=zoom_y,
+        rotation_angle=rotation_angle,
+        workers=workers,
+        cache=cache,
+        pages=pages,
+    )
+    for artifact in artifacts:
+        images.append(artifact.save(scratch.path))
 
-        y_offset = 0
-        for page_img in current_pages:
-            x_offset = (merged_width - page_img.width) // 2
-            merged_img.paste(page_img, (x_offset, y_offset))
-            y_offset += page_img.height
+    return images, scratch
 
-        output_path = os.path.join(tmpdirname, f"merged_page_{i // pages_per_image + 1}.png")
-        merged_img.save(output_path)
-        images.append(output_path)
 
-    return images, tmpdirname
+def iter_pdf_thumbnails(pdf_stream, zoom=THUMBNAIL_ZOOM, rotation_angle=0, pages=None, cache=None, digest=None):
+    # 低倍率逐页渲染缩略图，产出 (0 起页码, 图片)；串行渲染，第一张几乎立即可见
+    matrix = fitz.Matrix(zoom, zoom).prerotate(rotation_angle)
+    if cache is not None and digest is None:
+        digest = pdf_digest(pdf_stream)
+    pdf = _open_pdf(pdf_stream)
+    try:
+        for i in _resolve_pages(pages, len(pdf)):
+            name = f"thumb_{i + 1}.png"
+            key = RenderCache.thumbnail_key(digest, i, zoom, rotation_angle) if cache is not None else None
+            data = cache.get(key) if key is not None else None
+            if data is not None:
+                yield i, png_artifact(name, data)
+                continue
+            img, pix = _render_page(pdf[i], matrix)
+            artifact = encode_image(img, name, compress_level=1)
+            del img, pix
+            if key is not None:
+                cache.put(key, artifact.data)
+            yield i, artifact
+    finally:
+        pdf.close()
 
 
-def zip_images(image_paths):
-    buffer = BytesIO()
-    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-        for p in image_paths:
-            zipf.write(p, arcname=os.path.basename(p))
-    buffer.seek(0)
-    return buffer
+def run_pdf_job(job, params):
+    # 后台任务：渲染所选页面，每张图写入任务目录并同步打包 ZIP
+    pages_per_image = params["pages_per_image"]
+    total = max(1, -(-len(params["pages"]) // pages_per_image))
+    # 任务进程池中可能同时运行多个任务，渲染进程数按核数平分，避免两层进程池的进程数相乘
+    workers = job.options.get("workers", DEFAULT_RENDER_WORKERS)
+    workers = min(workers, max(1, (os.cpu_count() or 1) // job_worker_count()))
+    cache = RenderCache()
+    artifacts = iter_pdf_artifacts(
+        job.input_path("source.pdf"),
+        pages_per_image=pages_per_image,
+        zoom_x=params["zoom"],
+        zoom_y=params["zoom"],
+        rotation_angle=params["rotation"],
+        workers=workers,
+        cache=cache,
+        pages=params["pages"],
+        digest=params["digest"],
+    )
+    archive_name = "converted_images.zip"
+    with open(job.output_path(archive_name), "wb") as f, ArchiveBuilder(f) as archive:
+        for i, artifact in enumerate(artifacts, start=1):
+            artifact.save(job.output_dir)
+            job.add_output(artifact.name)
+            archive.add(artifact)
+            job.progress(i / total, f"已完成 {i} / {total} 张")
+    job.set_archive(archive_name)
+    job.progress(1.0, "转换完成", cache_stats=cache.stats())
 
 
 # ====== Markdown 转图片（简易样式版） ======
-def markdown_to_image(md_text, font_size=20, width=800, padding=20):
-    try:
-        font = ImageFont.truetype("arial.ttf", font_size)
-        bold_font = ImageFont.truetype("arialbd.ttf", font_size)
-        mono_font = ImageFont.truetype("cour.ttf", font_size)
-    except OSError:
-        font = ImageFont.load_default()
-        bold_font = font
-        mono_font = font
+def _render_markdown(md_text, font_size=20, width=800, padding=20):
+    font = load_named_font("arial.ttf", font_size)
+    bold_font = load_named_font("arialbd.ttf", font_size, fallback=font)
+    mono_font = load_named_font("cour.ttf", font_size, fallback=font)
 
     lines = []
     in_code_block = False 
@@ -108,53 +380,167 @@ def markdown_to_image(md_text, font_size=20, width=800, padding=20):
             lines.append(("normal", line))
 
     line_height = font.getbbox("A")[3] + 8
-    
-    total_lines = 0
+    text_box_width = width - padding * 2
+    fonts_by_style = {"bold": bold_font, "code": mono_font, "normal": font}
+
+    # 先按真实字宽一次性排好所有行，图片高度和绘制共用同一份结果
+    laid_out = []
     for style, text in lines:
-        if style in ["bold", "code"]:
-            total_lines += 1
-        else:
-            wrapped = textwrap.wrap(text, width=60)
-            total_lines += max(1, len(wrapped))
-            
-    img_height = padding * 2 + total_lines * line_height
-    
+        max_width = text_box_width - 10 if style == "code" else text_box_width
+        for wline in wrap_text(text, fonts_by_style[style], max_width):
+            laid_out.append((style, wline))
+
+    img_height = padding * 2 + len(laid_out) * line_height
+
     img = Image.new("RGB", (width, img_height), color="white")
     draw = ImageDraw.Draw(img)
 
     y = padding
     code_bg_color = (240, 240, 240)
 
-    for style, text in lines:
-        if style == "bold":
-            draw.text((padding, y), text, font=bold_font, fill="black")
-            y += line_height
-        elif style == "code":
-            text_box_width = width - padding * 2
+    for style, text in laid_out:
+        if style == "code":
             draw.rectangle([padding, y, padding + text_box_width, y + line_height], fill=code_bg_color)
             draw.text((padding + 5, y), text, font=mono_font, fill="black")
-            y += line_height
         else:
-            wrapped = textwrap.wrap(text, width=60)
-            if not wrapped:
-                 y += line_height
-            for wline in wrapped:
-                draw.text((padding, y), wline, font=font, fill="black")
-                y += line_height
-            
-    output_path = os.path.join(tempfile.mkdtemp(), "markdown.png")
-    img.save(output_path)
-    return output_path
+            draw.text((padding, y), text, font=fonts_by_style[style], fill="black")
+        y += line_height
+
+    return img
+
+
+def markdown_to_artifact(md_text, font_size=20, width=800, padding=20):
+    img = _render_markdown(md_text, font_size=font_size, width=width, padding=padding)
+    return encode_image(img, "markdown.png")
+
+
+def markdown_to_image(md_text, font_size=20, width=800, padding=20, session_id=None):
+    scratch = create_scratch_dir(session_id=session_id, prefix="md_")
+    artifact = markdown_to_artifact(md_text, font_size=font_size, width=width, padding=padding)
+    return artifact.save(scratch.path), scratch
+
+
+def _pin_download(response, scratch):
+    # 把响应缓存中的文件固定到本次会话的临时目录，避免渲染途中被缓存淘汰
+    if response.body_path is None:
+        return response.content
+    pdf_path = scratch.file("source.pdf")
+    try:
+        os.link(response.body_path, pdf_path)
+    except OSError:
+        shutil.copyfile(response.body_path, pdf_path)
+    return pdf_path
+
+
+@st.cache_resource
+def _get_render_cache():
+    return RenderCache()
+
+
+def _show_cache_stats(stats):
+    st.caption(
+        f"渲染缓存：命中 {stats['hits']} 次 / 未命中 {stats['misses']} 次"
+        f"（命中率 {stats['hit_rate']:.0%}，占用 {stats['bytes'] / 1024 / 1024:.1f} MB）"
+    )
+
 
 # ====== 显示结果 ======
-def show_results(paths):
-    st.success(f"转换完成！共 {len(paths)} 张图片。")
-    for i, p in enumerate(paths):
-        img = Image.open(p)
-        st.image(img, caption=f"图片 {i + 1}", use_container_width=True)
-    
-    zip_file = zip_images(paths)
-    st.download_button("📦 下载全部（ZIP）", data=zip_file, file_name="converted_images.zip", mime="application/zip")
+def show_results(artifacts):
+    # artifacts 可以是生成器：每渲染完一张就立即预览，并同步写入压缩包
+    status = st.empty()
+    scratch = create_scratch_dir(prefix="zip_")
+    archive_path = scratch.file("converted_images.zip")
+    with open(archive_path, "wb") as f, ArchiveBuilder(f) as archive:
+        for i, artifact in enumerate(artifacts):
+            with stage("transfer"):
+                st.image(artifact.data, caption=f"图片 {i + 1}", use_container_width=True)
+            with stage("zip"):
+                archive.add(artifact)
+    status.success(f"转换完成！共 {archive.count} 张图片。")
+
+    with stage("transfer"), open(archive_path, "rb") as zip_file:
+        st.download_button("📦 下载全部（ZIP）", data=zip_file, file_name="converted_images.zip", mime="application/zip")
+
+def _show_thumbnails(pdf_source, digest, num_pages, rotation_angle, cache):
+    # 低倍率缩略图网格，逐张出现；缩略图同样进入渲染缓存，交互导致的重跑几乎不耗时
+    shown = min(num_pages, THUMBNAIL_LIMIT)
+    with st.expander(f"📑 页面预览（共 {num_pages} 页）", expanded=True):
+        if shown < num_pages:
+            st.caption(f"仅预览前 {shown} 页，其余页面可直接在页码范围中选择。")
+        cols = st.columns(THUMBNAIL_COLUMNS)
+        thumbnails = iter_pdf_thumbnails(
+            pdf_source, rotation_angle=rotation_angle, pages=range(shown), cache=cache, digest=digest
+        )
+        for n, (i, artifact) in enumerate(timed_iter("thumbnail", thumbnails)):
+            cols[n % THUMBNAIL_COLUMNS].image(artifact.data, caption=f"第 {i + 1} 页", use_container_width=True)
+
+
+def _convert_pdf(pdf_source, digest, key, options):
+    # 页码范围和转换按钮放在缩略图上方并最先输出，缩略图还在逐张渲染时就能选页、开始转换；
+    # 全分辨率只渲染用户选中的页面。digest 由调用方算好并保存在会话中，重跑时不再哈希
+    num_pages = pdf_page_count(pdf_source)
+    controls = st.container()
+    results = st.container()
+
+    job_id = params = selected = None
+    with controls:
+        page_spec = st.text_input(
+            "页码范围",
+            key=f"{key}_pages",
+            placeholder=f"如 1-3,5,8-（共 {num_pages} 页，留空为全部）",
+        )
+        try:
+            selected = parse_page_ranges(page_spec, num_pages)
+        except ValueError as e:
+            st.warning(str(e))
+        else:
+            # 转换在后台任务进程中进行，任务 id 由文件摘要和参数决定：
+            # 交互导致的重跑会接着等待同一个任务，已完成的结果直接从磁盘读取
+            params = {
+                "digest": digest,
+                "pages": selected,
+                "pages_per_image": int(options["pages_per_image"]),
+                "zoom": options["zoom_x"],
+                "rotation": options["rotation_angle"],
+            }
+            job_key = f"{key}_job"
+            if st.button(f"转换所选 {len(selected)} 页", key=f"{key}_convert"):
+                st.session_state[job_key] = submit_job(
+                    "pdf2png", params, inputs={"source.pdf": pdf_source}, options={"workers": int(options["workers"])}
+                )
+            job_id = st.session_state.get(job_key)
+
+    # 任务已在后台进程中运行，先出缩略图，再回到上方的结果区等待任务
+    with track_request("pdf2png_preview", source=key, pages=num_pages):
+        _show_thumbnails(pdf_source, digest, num_pages, options["rotation_angle"], options["cache"])
+
+    if job_id is None or job_id != job_id_for("pdf2png", params):
+        return
+    with results:
+        with track_request("pdf2png", source=key, job=job_id, pages=len(selected)):
+            with stage("job_wait"):
+                record = wait_for_job(job_id)
+            with stage("transfer"):
+                show_job_results(job_id, record)
+        if record is not None and "cache_stats" in record["extra"]:
+            _show_cache_stats(record["extra"]["cache_stats"])
+
+
+def show_job_results(job_id, record):
+    # 展示后台任务写在磁盘上的结果；重跑时直接读文件，不会重新渲染
+    if record is None:
+        st.info("任务结果已被清理，请重新转换。")
+        return
+    if record["status"] == "failed":
+        st.error(f"转换失败：{record['error']}")
+        return
+    manager = get_job_manager()
+    st.success(f"转换完成！共 {len(record['outputs'])} 张图片。")
+    for i, name in enumerate(record["outputs"]):
+        st.image(manager.output_path(job_id, name), caption=f"图片 {i + 1}", use_container_width=True)
+    with open(manager.output_path(job_id, record["archive"]), "rb") as zip_file:
+        st.download_button("📦 下载全部（ZIP）", data=zip_file, file_name=record["archive"], mime="application/zip")
+
 
 # ====== 主程序 ======
 def run_pdf_to_png_app():
@@ -176,44 +562,77 @@ def run_pdf_to_png_app():
         step=1,
         help="选择 1 表示不合并，选择大于 1 的数字表示该数量的页数将**纵向**合并为一张长图。"
     )
+    render_workers = st.sidebar.number_input(
+        "渲染进程数",
+        min_value=1,
+        max_value=os.cpu_count() or 1,
+        value=DEFAULT_RENDER_WORKERS,
+        step=1,
+        help=f"大于 1 时多进程并行渲染；少于 {PARALLEL_MIN_PAGES} 页的文档始终串行渲染。"
+    )
+    render_cache = _get_render_cache()
+
+    options = {
+        "pages_per_image": pages_per_image,
+        "zoom_x": zoom,
+        "zoom_y": zoom,
+        "rotation_angle": rotation,
+        "workers": render_workers,
+        "cache": render_cache,
+    }
 
     # 上传 PDF
     with tab1:
         uploaded_file = st.file_uploader("上传 PDF 文件", type=["pdf"])
         if uploaded_file:
-            with st.spinner("正在转换为图片..."):
-                paths, _ = pdf_to_images(
-                    uploaded_file.read(), 
-                    pages_per_image=pages_per_image,
-                    zoom_x=zoom, 
-                    zoom_y=zoom, 
-                    rotation_angle=rotation
-                )
-            show_results(paths)
+            try:
+                pdf_bytes = uploaded_file.getvalue()
+                # 同一个上传文件只算一次摘要
+                upload = st.session_state.get("pdf_upload")
+                if upload is None or upload["file_id"] != uploaded_file.file_id:
+                    upload = {"file_id": uploaded_file.file_id, "digest": pdf_digest(pdf_bytes)}
+                    st.session_state["pdf_upload"] = upload
+                _convert_pdf(pdf_bytes, upload["digest"], "upload", options)
+            except Exception as e:
+                st.error(f"转换失败: {e}")
 
     # PDF 链接
     with tab2:
         pdf_url = st.text_input("请输入 PDF 链接")
-        if pdf_url and st.button("下载并转换", key="link_convert"):
+        if pdf_url and st.button("下载 PDF", key="link_download"):
             if not pdf_url.startswith(("http://", "https://")):
                 st.warning("请输入有效的 PDF 链接（以 http:// 或 https:// 开头）。")
                 return
             try:
-                with st.spinner("正在下载 PDF..."):
-                    r = requests.get(pdf_url, headers=REQUEST_HEADERS, timeout=15)
-                    r.raise_for_status()
-                    pdf_bytes = BytesIO(r.content)
-                with st.spinner("正在转换为图片..."):
-                    paths, _ = pdf_to_images(
-                        pdf_bytes.read(), 
-                        pages_per_image=pages_per_image,
-                        zoom_x=zoom, 
-                        zoom_y=zoom, 
-                        rotation_angle=rotation
-                    )
-                show_results(paths)
+                with track_request("pdf2png", source="link_download"):
+                    progress_bar = st.progress(0.0, text="正在下载 PDF...")
+
+                    def on_progress(received, total):
+                        fraction = min(received / total, 1.0) if total else 0.0
+                        progress_bar.progress(fraction, text=f"正在下载 PDF... {received / 1024 / 1024:.1f} MB")
+
+                    with stage("download"):
+                        r = http_fetch(pdf_url, timeout=15, progress=on_progress)
+                    progress_bar.empty()
+                    # 下载内容已分块写入磁盘，之后按路径交给 PyMuPDF 打开；路径保存在会话中，预览和转换时不再重新下载
+                    scratch = create_scratch_dir(prefix="pdf_")
+                    source = _pin_download(r, scratch)
+                    st.session_state["pdf_link"] = {"url": pdf_url, "source": source, "digest": pdf_digest(source)}
             except Exception as e:
-                st.error(f"下载或转换失败: {e}")
+                st.error(f"下载失败: {e}")
+
+        link = st.session_state.get("pdf_link")
+        if link and link["url"] == pdf_url:
+            source = link["source"]
+            if isinstance(source, str) and not os.path.exists(source):
+                # 临时目录可能已被按限额清理
+                del st.session_state["pdf_link"]
+                st.info("下载的文件已过期，请重新下载。")
+            else:
+                try:
+                    _convert_pdf(source, link["digest"], "link", options)
+                except Exception as e:
+                    st.error(f"转换失败: {e}")
 
     # Markdown 转图片
     with tab3:
@@ -225,8 +644,10 @@ def run_pdf_to_png_app():
         font_size = st.slider("字体大小", 12, 40, 20)
         if st.button("生成图片", key="md_convert"):
             if md_input.strip():
-                path = markdown_to_image(md_input, font_size=font_size)
-                show_results([path])
+                with track_request("markdown", chars=len(md_input), font_size=font_size):
+                    with stage("render"):
+                        artifact = markdown_to_artifact(md_input, font_size=font_size)
+                    show_results([artifact])
             else:
                 st.warning("请输入 Markdown 内容！")
 
@@ -0,0 +1,41 @@
+import os
+
+
+if os.name == "nt":
+    import ctypes
+
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    _PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    _STILL_ACTIVE = 259
+    _ERROR_ACCESS_DENIED = 5
+
+    def pid_alive(pid):
+        # Windows 上 os.kill(pid, 0) 会发送 CTRL_C_EVENT，改为打开进程句柄查询退出码
+        if pid <= 0:
+            return False
+        handle = _kernel32.OpenProcess(_PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            # 无权访问说明进程存在
+            return ctypes.get_last_error() == _ERROR_ACCESS_DENIED
+        try:
+            code = ctypes.c_ulong()
+            if not _kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+                return True
+            return code.value == _STILL_ACTIVE
+        finally:
+            _kernel32.CloseHandle(handle)
+
+else:
+
+    def pid_alive(pid):
+        # 信号 0 只检查进程是否存在；pid <= 0 表示进程组，不能用来探测
+        if pid <= 0:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            # PermissionError 等：进程存在但属于其他用户
+            return True
+        return True
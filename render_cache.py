@@ -0,0 +1,132 @@
+import hashlib
+import os
+import tempfile
+import threading
+from io import BytesIO
+
+from PIL import Image
+
+from app_dirs import cache_dir
+
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def pdf_digest(pdf_source):
+    # 支持字节或文件路径；文件按块哈希，不整体读入内存
+    if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(pdf_source).hexdigest()
+    digest = hashlib.sha256()
+    with open(pdf_source, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# 按 PDF 内容哈希和渲染参数寻址的磁盘缓存，超出容量时按最近使用时间淘汰
+class RenderCache:
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root or cache_dir("renders")
+        os.makedirs(self.root, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes = sum(size for _, size, _ in self._scan())
+
+    @staticmethod
+    def key(digest, start, zoom_x, zoom_y, rotation, pages_per_image):
+        # pages_per_image=1 的合并组就是单页，不同合并页数之间可以复用单页结果
+        return f"{digest}_{start}_{zoom_x:g}x{zoom_y:g}_r{int(rotation)}_n{int(pages_per_image)}"
+
+    @staticmethod
+    def thumbnail_key(digest, page, zoom, rotation):
+        # 缩略图单独的键空间，与全分辨率渲染的键不会重合
+        return f"thumb_{digest}_{page}_{zoom:g}_r{int(rotation)}"
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.png")
+
+    def _scan(self):
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if not entry.name.endswith(".png"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def contains(self, key):
+        # 只在这里记未命中；命中在随后真正读取（get）时记，避免重复计数
+        if os.path.exists(self._path(key)):
+            return True
+        with self._lock:
+            self.misses += 1
+        return False
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def get_image(self, key):
+        data = self.get(key)
+        if data is None:
+            return None
+        img = Image.open(BytesIO(data))
+        img.load()
+        return img if img.mode == "RGB" else img.convert("RGB")
+
+    def put(self, key, data):
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        with self._lock:
+            # 覆盖已有条目时先扣掉旧文件的大小
+            try:
+                old_size = os.path.getsize(path)
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+            self._total_bytes += len(data) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(self._scan(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total_bytes = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
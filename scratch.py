@@ -0,0 +1,192 @@
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from process_utils import pid_alive
+
+
+SCRATCH_BASE = os.path.join(tempfile.gettempdir(), "webapp-scratch")
+DEFAULT_SESSION_QUOTA = 512 * 1024 * 1024
+DEFAULT_MAX_TOTAL_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_MAX_AGE = 6 * 60 * 60
+DEFAULT_SWEEP_INTERVAL = 5 * 60
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def current_session_id():
+    # 在 Streamlit 脚本线程中返回当前会话 id，其他场景归入 "default"
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return "default"
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "default"
+
+
+class ScratchDir:
+    def __init__(self, manager, session_id, path):
+        self.manager = manager
+        self.session_id = session_id
+        self.path = path
+        self.created = time.time()
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def size(self):
+        return _dir_size(self.path)
+
+    def cleanup(self):
+        self.manager.remove(self)
+
+    def __fspath__(self):
+        return self.path
+
+    def __str__(self):
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
+
+
+# 临时文件统一管理：按会话归档、限额、后台按时间和总量清理、进程退出时全部删除
+class ScratchManager:
+    def __init__(
+        self,
+        base=SCRATCH_BASE,
+        session_quota=DEFAULT_SESSION_QUOTA,
+        max_total_bytes=DEFAULT_MAX_TOTAL_BYTES,
+        max_age=DEFAULT_MAX_AGE,
+        sweep_interval=DEFAULT_SWEEP_INTERVAL,
+    ):
+        self.base = base
+        self.root = os.path.join(base, str(os.getpid()))
+        os.makedirs(self.root, exist_ok=True)
+        self.session_quota = session_quota
+        self.max_total_bytes = max_total_bytes
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self._dirs = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._janitor = None
+
+    def create(self, session_id=None, prefix=""):
+        session_id = session_id or current_session_id()
+        session_root = os.path.join(self.root, session_id)
+        os.makedirs(session_root, exist_ok=True)
+        path = os.path.join(session_root, f"{prefix}{uuid.uuid4().hex[:12]}")
+        os.makedirs(path)
+        scratch = ScratchDir(self, session_id, path)
+        with self._lock:
+            self._dirs[path] = scratch
+        self.enforce_quota(session_id, keep=scratch)
+        return scratch
+
+    def remove(self, scratch):
+        with self._lock:
+            self._dirs.pop(scratch.path, None)
+        shutil.rmtree(scratch.path, ignore_errors=True)
+
+    def session_dirs(self, session_id):
+        with self._lock:
+            dirs = [d for d in self._dirs.values() if d.session_id == session_id]
+        return sorted(dirs, key=lambda d: d.created)
+
+    def release_session(self, session_id):
+        for scratch in self.session_dirs(session_id):
+            self.remove(scratch)
+
+    def enforce_quota(self, session_id, keep=None):
+        # 超出会话限额时从最早的目录开始删除，保留刚创建的目录
+        dirs = self.session_dirs(session_id)
+        sizes = {d.path: d.size() for d in dirs}
+        used = sum(sizes.values())
+        for scratch in dirs:
+            if used <= self.session_quota:
+                break
+            if scratch is keep:
+                continue
+            self.remove(scratch)
+            used -= sizes[scratch.path]
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            dirs = sorted(self._dirs.values(), key=lambda d: d.created)
+        live = []
+        for scratch in dirs:
+            if now - scratch.created > self.max_age:
+                self.remove(scratch)
+            else:
+                live.append((scratch, scratch.size()))
+
+        total = sum(size for _, size in live)
+        for scratch, size in live:
+            if total <= self.max_total_bytes:
+                break
+            self.remove(scratch)
+            total -= size
+
+        # 清理已退出进程遗留的目录
+        try:
+            entries = os.listdir(self.base)
+        except FileNotFoundError:
+            return
+        for name in entries:
+            if name.isdigit() and int(name) != os.getpid() and not pid_alive(int(name)):
+                shutil.rmtree(os.path.join(self.base, name), ignore_errors=True)
+
+    def _janitor_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception:
+                pass
+
+    def start_janitor(self):
+        if self._janitor is None:
+            self._janitor = threading.Thread(target=self._janitor_loop, name="scratch-janitor", daemon=True)
+            self._janitor.start()
+
+    def cleanup_all(self):
+        self._stop.set()
+        with self._lock:
+            self._dirs.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+_default_manager = None
+_default_lock = threading.Lock()
+
+
+def get_scratch_manager():
+    global _default_manager
+    with _default_lock:
+        if _default_manager is None:
+            _default_manager = ScratchManager()
+            _default_manager.sweep()
+            _default_manager.start_janitor()
+            atexit.register(_default_manager.cleanup_all)
+    return _default_manager
+
+
+def create_scratch_dir(session_id=None, prefix=""):
+    return get_scratch_manager().create(session_id=session_id, prefix=prefix)
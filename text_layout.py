@@ -0,0 +1,123 @@
+import unicodedata
+from typing import Iterable, List
+
+from fonts import char_width
+
+
+# 行首禁则（不能出现在行首）和行尾禁则（不能出现在行尾）的标点
+NO_LINE_START = set("，。、；：！？）》」』】〕〉”’…—,.;:!?)]}%·～")
+NO_LINE_END = set("（《「『【〔〈“‘([{")
+
+
+def text_width(font, text: str):
+    # 逐字累加缓存的单字宽度，忽略字偶距，换行判断足够准确
+    return sum(char_width(font, ch) for ch in text)
+
+
+def _is_wide(ch: str):
+    return unicodedata.east_asian_width(ch) in ("W", "F")
+
+
+def _segments(text: str):
+    # 切分为不可再分的单元：连续空白、一个全角字符、或一段连续的半角非空白字符。
+    # 行首禁则标点并入前一个单元，行尾禁则标点并入后一个单元，单元之间即为断行机会
+    units = []
+    pending_open = ""
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch.isspace():
+            j = i
+            while j < n and text[j].isspace():
+                j += 1
+            unit = text[i:j]
+        elif _is_wide(ch) or ch in NO_LINE_START or ch in NO_LINE_END:
+            j = i + 1
+            unit = ch
+        else:
+            j = i
+            while j < n and not text[j].isspace() and not _is_wide(text[j]) \
+                    and text[j] not in NO_LINE_START and text[j] not in NO_LINE_END:
+                j += 1
+            unit = text[i:j]
+        i = j
+
+        if unit in NO_LINE_END:
+            pending_open += unit
+            continue
+        if pending_open:
+            unit = pending_open + unit
+            pending_open = ""
+        if units and not unit.isspace() and unit[0] in NO_LINE_START and not units[-1].isspace():
+            units[-1] += unit
+        else:
+            units.append(unit)
+    if pending_open:
+        units.append(pending_open)
+    return units
+
+
+def wrap_text(text: str, font, max_width: float) -> List[str]:
+    if not text:
+        return [""]
+
+    lines = []
+    line = ""
+    line_w = 0.0
+    for unit in _segments(text):
+        unit_w = text_width(font, unit)
+        if unit.isspace():
+            # 行首空白（续行时）直接丢弃
+            if line or not lines:
+                line += unit
+                line_w += unit_w
+            continue
+        if line_w + unit_w <= max_width:
+            line += unit
+            line_w += unit_w
+            continue
+        if line.strip():
+            lines.append(line.rstrip())
+            line, line_w = "", 0.0
+        # 单个单元比整行还宽（长单词、链接）时按字符硬断
+        for ch in unit:
+            ch_w = char_width(font, ch)
+            if line and line_w + ch_w > max_width:
+                lines.append(line.rstrip())
+                line, line_w = "", 0.0
+            line += ch
+            line_w += ch_w
+    if line.strip() or not lines:
+        lines.append(line.rstrip())
+    return lines
+
+
+def paginate_lines(
+    paragraphs: Iterable[str], font, max_width: float, lines_per_page: int, paragraph_gap: int = 1
+) -> List[List[str]]:
+    # 单次线性遍历：逐行填满每一页，段落可以跨页，段间空行不出现在页首，不丢任何文字
+    lines_per_page = max(1, int(lines_per_page))
+    pages = []
+    current = []
+    for paragraph in paragraphs:
+        if current:
+            for _ in range(paragraph_gap):
+                if len(current) >= lines_per_page:
+                    break
+                current.append("")
+        for line in wrap_text(paragraph, font, max_width):
+            if len(current) >= lines_per_page:
+                pages.append(_strip_blank_tail(current))
+                current = []
+            current.append(line)
+    current = _strip_blank_tail(current)
+    if current:
+        pages.append(current)
+    return pages
+
+
+def _strip_blank_tail(lines):
+    while lines and lines[-1] == "":
+        lines.pop()
+    return lines